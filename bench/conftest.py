@@ -0,0 +1,114 @@
+"""Fixtures and the latency report of the ICA shopping list benchmarks.
+
+Run with ``python -m pytest bench -q``. Every benchmark records the time of
+each operation; the report printed at the end has the p50 and p99 latency
+and the throughput per benchmark and list size, and the memory per item of
+benchmarks that measured it.
+"""
+import time
+import tracemalloc
+
+import pytest
+
+from tests.conftest import (  # noqa: F401
+    LIST_NAME,
+    auto_enable_custom_integrations,
+    fake_ica,
+    setup_integration,
+)
+
+ROW_COUNTS = (10, 100, 1000, 10000)
+
+_RESULTS = {}
+
+
+def _percentile(sorted_values, percent):
+    """Return the percentile of sorted values, nearest rank."""
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+class Benchmark:
+    """Timings of one benchmark."""
+
+    def __init__(self, name, rows):
+        """Initialize an empty benchmark."""
+        self.name = name
+        self.rows = rows
+        self.timings = []
+        self.bytes_per_item = None
+
+    async def measure(self, operation, iterations, setup=None):
+        """Time iterations awaits of operation(index), after setup(index) if given."""
+        for index in range(iterations):
+            if setup is not None:
+                await setup(index)
+            start = time.perf_counter()
+            await operation(index)
+            self.timings.append(time.perf_counter() - start)
+
+    def measure_sync(self, operation, iterations):
+        """Time iterations calls of operation(index)."""
+        for index in range(iterations):
+            start = time.perf_counter()
+            operation(index)
+            self.timings.append(time.perf_counter() - start)
+
+    def record(self, seconds):
+        """Add the time of one operation."""
+        self.timings.append(seconds)
+
+    def measure_memory(self, operation, items):
+        """Record the memory per item allocated by operation() and still held by its result."""
+        tracemalloc.start()
+        try:
+            result = operation()
+            self.bytes_per_item = tracemalloc.get_traced_memory()[0] / items
+        finally:
+            tracemalloc.stop()
+        return result
+
+    def summary(self):
+        """Return the p50 and p99 latency in seconds and the operations per second."""
+        timings = sorted(self.timings)
+        total = sum(timings)
+        return (
+            _percentile(timings, 50),
+            _percentile(timings, 99),
+            len(timings) / total if total else float("inf"),
+        )
+
+
+@pytest.fixture
+def benchmark():
+    """Return a function returning the recorded Benchmark of a name and list size.
+
+    Tests asking for the same name and size add to the same timings.
+    """
+
+    def get(name, rows):
+        bench = _RESULTS.get((name, rows))
+        if bench is None:
+            bench = _RESULTS[name, rows] = Benchmark(name, rows)
+        return bench
+
+    return get
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Print the latency report."""
+    results = [bench for bench in _RESULTS.values() if bench.timings]
+    if not results:
+        return
+    terminalreporter.section("benchmarks")
+    terminalreporter.write_line(
+        f"{'benchmark':<36}{'rows':>8}{'ops':>8}{'p50 ms':>12}{'p99 ms':>12}{'ops/s':>12}"
+        f"{'B/item':>10}"
+    )
+    for bench in results:
+        p50, p99, rate = bench.summary()
+        terminalreporter.write_line(
+            f"{bench.name:<36}{bench.rows:>8}{len(bench.timings):>8}"
+            f"{p50 * 1000:>12.4f}{p99 * 1000:>12.4f}{rate:>12.1f}"
+            + ("" if bench.bytes_per_item is None else f"{bench.bytes_per_item:>10.0f}")
+        )
@@ -0,0 +1,61 @@
+"""Benchmarks of requests against the ICA API."""
+import pytest
+
+from custom_components.ica_shopping_list.api import (
+    Connect,
+    IcaAccount,
+    async_create_session,
+)
+
+from tests.fake_ica import make_rows
+
+from .conftest import LIST_NAME, ROW_COUNTS
+
+ITERATIONS = 100
+TIMEOUT = 10
+CONNECT_TIMEOUT = 5
+
+
+@pytest.fixture(params=ROW_COUNTS)
+def rows(request):
+    """Return the number of rows of the list."""
+    return request.param
+
+
+@pytest.fixture
+async def client(hass, fake_ica, rows):
+    """Return a logged in client of a list with rows items on a pooled session."""
+    fake_ica.add_list(LIST_NAME, make_rows(rows))
+    session = async_create_session(TIMEOUT, CONNECT_TIMEOUT)
+    account = IcaAccount(hass, session, fake_ica.username, fake_ica.password, fake_ica.url)
+    client = Connect(account, LIST_NAME)
+    assert await client.get_request("/api/user/offlineshoppinglists") is not None
+    yield client
+    await account.session.close()
+
+
+async def test_pooled_session(hass, benchmark, client, rows):
+    """Fetch the list over the shared, kept alive session."""
+
+    async def fetch(_):
+        assert await client.get_request("/api/user/offlineshoppinglists") is not None
+
+    await benchmark("get_request pooled session", rows).measure(fetch, ITERATIONS)
+
+
+async def test_session_per_request(hass, benchmark, client, rows):
+    """Fetch the list over a new session per request, as before it was pooled."""
+    account = client.account
+    pooled = account.session
+
+    async def fetch(_):
+        account.session = async_create_session(TIMEOUT, CONNECT_TIMEOUT)
+        try:
+            assert await client.get_request("/api/user/offlineshoppinglists") is not None
+        finally:
+            await account.session.close()
+
+    try:
+        await benchmark("get_request session per request", rows).measure(fetch, ITERATIONS)
+    finally:
+        account.session = pooled
@@ -0,0 +1,38 @@
+"""Benchmarks of article group classification."""
+import random
+
+from custom_components.ica_shopping_list.classifier import ArticleGroupClassifier
+
+NAMES = 100000
+WORDS = (
+    "Kaffe", "Kaffebönor", "Diskmedel", "Toapapper", "Mjölk", "Bröd", "Ost",
+    "Äpplen", "Bananer", "Pasta", "Ris", "Tomater", "Gurka", "Smör", "Ägg",
+)
+
+
+def _names(count, distinct):
+    """Return count product names, all different if distinct."""
+    rand = random.Random(0)
+    if distinct:
+        return [f"{rand.choice(WORDS)} {index}" for index in range(count)]
+    return [f"{rand.choice(WORDS)} {rand.randrange(100)}" for _ in range(count)]
+
+
+def test_classify_distinct(benchmark):
+    """Classify names that are never repeated, so the cache never helps."""
+    classifier = ArticleGroupClassifier.from_files()
+    names = _names(NAMES, True)
+
+    benchmark("classify distinct names", NAMES).measure_sync(
+        lambda index: classifier.classify(names[index]), NAMES
+    )
+
+
+def test_classify_repeated(benchmark):
+    """Classify a small set of names over and over, as automations do."""
+    classifier = ArticleGroupClassifier.from_files()
+    names = _names(NAMES, False)
+
+    benchmark("classify repeated names", NAMES).measure_sync(
+        lambda index: classifier.classify(names[index]), NAMES
+    )
@@ -0,0 +1,34 @@
+"""Benchmarks of encoding and decoding ICA payloads, orjson against the standard library."""
+import json
+
+import pytest
+
+from custom_components.ica_shopping_list import codec
+
+from tests.fake_ica import make_rows
+
+ROWS = 10000
+ITERATIONS = 20
+
+orjson = pytest.importorskip("orjson")
+
+
+def _json_dumps(obj):
+    """Encode like the codec does without orjson."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+@pytest.mark.parametrize(("name", "dumps"), [("orjson", orjson.dumps), ("json", _json_dumps)])
+def test_encode(benchmark, name, dumps):
+    """Encode the Rows of a list."""
+    body = {"Rows": make_rows(ROWS)}
+
+    benchmark(f"encode {name}", ROWS).measure_sync(lambda _: dumps(body), ITERATIONS)
+
+
+@pytest.mark.parametrize(("name", "loads"), [("orjson", orjson.loads), ("json", json.loads)])
+def test_decode(benchmark, name, loads):
+    """Decode the Rows of a list."""
+    body = codec.dumps({"Rows": make_rows(ROWS)})
+
+    benchmark(f"decode {name}", ROWS).measure_sync(lambda _: loads(body), ITERATIONS)
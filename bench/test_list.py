@@ -0,0 +1,153 @@
+"""Benchmarks of loading, changing and serving a shopping list."""
+import pytest
+
+from custom_components.ica_shopping_list import (
+    WS_TYPE_SHOPPING_LIST_ADD_ITEM,
+    WS_TYPE_SHOPPING_LIST_CLEAR_ITEMS,
+    WS_TYPE_SHOPPING_LIST_ITEMS,
+    WS_TYPE_SHOPPING_LIST_UPDATE_ITEM,
+)
+
+from tests.fake_ica import make_rows
+
+from .conftest import LIST_NAME, ROW_COUNTS
+
+ITERATIONS = 50
+
+
+@pytest.fixture(params=ROW_COUNTS)
+def rows(request):
+    """Return the number of rows of the list."""
+    return request.param
+
+
+@pytest.fixture
+async def shopping_list(hass, fake_ica, setup_integration, rows):
+    """Return the list set up with rows items, every third one completed."""
+    fake_ica.add_list(LIST_NAME, make_rows(rows, complete_every=3))
+    data = await setup_integration()
+    assert len(data.items) == rows
+    return data
+
+
+async def test_load(hass, benchmark, shopping_list, rows):
+    """Load the stored snapshot and journal."""
+    await hass.async_block_till_done()
+
+    async def load(_):
+        await shopping_list.async_load()
+
+    await benchmark("async_load", rows).measure(load, ITERATIONS)
+
+
+async def test_reconcile(hass, benchmark, shopping_list, rows):
+    """Fetch an unchanged list from ICA and compare it."""
+
+    async def reconcile(_):
+        assert await shopping_list.async_reconcile() is False
+
+    await benchmark("async_reconcile", rows).measure(reconcile, ITERATIONS)
+
+
+async def test_add(hass, benchmark, shopping_list, rows):
+    """Add items, then wait for them to reach ICA."""
+
+    async def add(index):
+        await shopping_list.async_add(f"Added {index}")
+
+    await benchmark("async_add", rows).measure(add, ITERATIONS)
+    await hass.async_block_till_done()
+    assert len(shopping_list.items) == rows + ITERATIONS
+
+
+async def test_update(hass, benchmark, shopping_list, rows):
+    """Toggle items."""
+    items = shopping_list.items
+
+    async def update(index):
+        item = items[index % len(items)]
+        await shopping_list.async_update(item.id, {"complete": not item.complete})
+
+    await benchmark("async_update", rows).measure(update, ITERATIONS)
+    await hass.async_block_till_done()
+
+
+async def test_clear_completed(hass, benchmark, shopping_list, rows):
+    """Clear completed items after completing one more each time."""
+
+    async def complete(index):
+        item = next(item for item in shopping_list.items if not item.complete)
+        await shopping_list.async_update(item.id, {"complete": True})
+
+    async def clear(_):
+        await shopping_list.async_clear_completed()
+
+    await benchmark("async_clear_completed", rows).measure(
+        clear, min(ITERATIONS, rows * 2 // 3), complete
+    )
+    await hass.async_block_till_done()
+
+
+async def test_view_get(hass, hass_client, benchmark, shopping_list, rows):
+    """Serve the items over REST, changing the list before every request."""
+    client = await hass_client()
+    items = shopping_list.items
+
+    async def change(index):
+        item = items[index % len(items)]
+        await shopping_list.async_update(item.id, {"name": f"Renamed {index}"})
+
+    async def get(_):
+        resp = await client.get("/api/shopping_list")
+        assert resp.status == 200
+        await resp.read()
+
+    await benchmark("GET /api/shopping_list", rows).measure(get, ITERATIONS, change)
+    await hass.async_block_till_done()
+
+
+async def test_view_add(hass, hass_client, benchmark, shopping_list, rows):
+    """Add items over REST."""
+    client = await hass_client()
+
+    async def add(index):
+        resp = await client.post("/api/shopping_list/item", json={"name": f"Added {index}"})
+        assert resp.status == 200
+        await resp.read()
+
+    await benchmark("POST /api/shopping_list/item", rows).measure(add, ITERATIONS)
+    await hass.async_block_till_done()
+
+
+async def test_websocket(hass, hass_ws_client, benchmark, shopping_list, rows):
+    """Read, add, update and clear items over the websocket API."""
+    client = await hass_ws_client(hass)
+    items = shopping_list.items
+
+    async def command(**msg):
+        await client.send_json_auto_id(msg)
+        resp = await client.receive_json()
+        assert resp["success"], resp
+
+    async def get(_):
+        await command(type=WS_TYPE_SHOPPING_LIST_ITEMS)
+
+    async def add(index):
+        await command(type=WS_TYPE_SHOPPING_LIST_ADD_ITEM, name=f"Added {index}")
+
+    async def update(index):
+        item = items[index % len(items)]
+        await command(
+            type=WS_TYPE_SHOPPING_LIST_UPDATE_ITEM,
+            item_id=item.id,
+            complete=not item.complete,
+        )
+
+    async def clear(_):
+        await command(type=WS_TYPE_SHOPPING_LIST_CLEAR_ITEMS)
+
+    await benchmark("ws shopping_list/items", rows).measure(get, ITERATIONS)
+    await benchmark("ws shopping_list/items/add", rows).measure(add, ITERATIONS)
+    await benchmark("ws shopping_list/items/update", rows).measure(update, ITERATIONS)
+    await benchmark("ws shopping_list/items/clear", rows).measure(clear, 1)
+    await hass.async_block_till_done()
@@ -0,0 +1,42 @@
+"""Benchmarks of parsing the Rows of ICA responses."""
+import logging
+
+from custom_components.ica_shopping_list.store import parse_rows
+
+from tests.fake_ica import make_rows
+
+ROWS = 10000
+ITERATIONS = 20
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_rows_as_dicts(rows):
+    """Return the Rows as dicts, as the items were kept before ShoppingItem."""
+    items = []
+    for row in rows:
+        name = row["ProductName"].capitalize()
+        uuid = row["OfflineId"]
+        complete = row["IsStrikedOver"]
+        source = row["SourceId"]
+
+        item = {"name": name, "id": uuid, "complete": complete, "SourceId": source}
+        _LOGGER.debug("Item: " + str(item))
+        items.append(item)
+    return items
+
+
+def test_parse_rows(benchmark):
+    """Parse Rows into slotted ShoppingItems."""
+    rows = make_rows(ROWS)
+    bench = benchmark("parse_rows ShoppingItem", ROWS)
+    bench.measure_memory(lambda: parse_rows(rows), ROWS)
+    bench.measure_sync(lambda _: parse_rows(rows), ITERATIONS)
+
+
+def test_parse_rows_as_dicts(benchmark):
+    """Parse Rows into a dict per row."""
+    rows = make_rows(ROWS)
+    bench = benchmark("parse_rows dict per row", ROWS)
+    bench.measure_memory(lambda: parse_rows_as_dicts(rows), ROWS)
+    bench.measure_sync(lambda _: parse_rows_as_dicts(rows), ITERATIONS)
@@ -0,0 +1,59 @@
+"""Benchmarks of setting up the integration while ICA answers slowly."""
+import time
+
+import pytest
+
+from homeassistant.setup import async_setup_component
+from homeassistant.util import slugify
+
+from custom_components.ica_shopping_list import DOMAIN, SNAPSHOT_STORAGE_KEY
+
+from tests.fake_ica import make_rows
+
+from .conftest import LIST_NAME, ROW_COUNTS
+
+LATENCY = 0.2
+RUNS = 5
+
+
+@pytest.mark.parametrize("run", range(RUNS))
+@pytest.mark.parametrize("rows", ROW_COUNTS)
+async def test_startup(hass, hass_storage, benchmark, fake_ica, rows, run):
+    """Time the setup, loading the snapshot and the first fetch from ICA."""
+    list_rows = make_rows(rows)
+    fake_ica.add_list(LIST_NAME, list_rows)
+    fake_ica.latency = LATENCY
+    key = SNAPSHOT_STORAGE_KEY.format(slugify(LIST_NAME))
+    hass_storage[key] = {
+        "version": 1,
+        "key": key,
+        "data": [
+            {
+                "name": row["ProductName"],
+                "id": row["OfflineId"],
+                "complete": row["IsStrikedOver"],
+                "SourceId": row["SourceId"],
+            }
+            for row in list_rows
+        ],
+    }
+    assert await async_setup_component(hass, "http", {})
+    config = {
+        "username": fake_ica.username,
+        "password": fake_ica.password,
+        "listname": LIST_NAME,
+        "api_url": fake_ica.url,
+    }
+
+    start = time.perf_counter()
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    benchmark("startup setup", rows).record(time.perf_counter() - start)
+
+    data = hass.data[DOMAIN][LIST_NAME]
+    await data.async_wait_loaded()
+    benchmark("startup until loaded", rows).record(time.perf_counter() - start)
+    assert len(data.items) == rows
+
+    await hass.async_block_till_done()
+    benchmark("startup until fetched from ICA", rows).record(time.perf_counter() - start)
+    assert fake_ica.count("GET", data.client.listId) == 1
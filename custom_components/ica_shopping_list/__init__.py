@@ -1,62 +1,218 @@
 """Support to manage a shopping list."""
 import asyncio
 import logging
+import time
 import uuid
-import requests
-import json
-import secrets
 
+from aiohttp import hdrs, web
 import voluptuous as vol
 
-from homeassistant.core import callback
+from homeassistant.core import SupportsResponse, callback
 from homeassistant.components import http
 from homeassistant.components.http.data_validator import RequestDataValidator
-from homeassistant.helpers import intent
+from homeassistant.helpers import discovery, intent
+from homeassistant.helpers.storage import Store
 import homeassistant.helpers.config_validation as cv
-from homeassistant.util.json import load_json, save_json
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import slugify
 from homeassistant.components import websocket_api
-from homeassistant.const import (CONF_PASSWORD, CONF_USERNAME)
-
-import aiohttp #handle http requests
+from homeassistant.const import (
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    CONF_TIMEOUT,
+    EVENT_HOMEASSISTANT_STARTED,
+    EVENT_HOMEASSISTANT_STOP,
+)
 
+from .api import (
+    API_URL,
+    DEFAULT_FAILURE_THRESHOLD,
+    DEFAULT_RECOVERY_TIMEOUT,
+    DEFAULT_RETRIES,
+    CircuitBreaker,
+    Connect,
+    IcaAccount,
+    IcaRejectedError,
+    async_create_session,
+)
+from .classifier import ArticleGroupClassifier
+from .codec import dumps
+from .coordinator import ListPoller
+from .journal import MutationJournal, SyncBatch
+from .matcher import DEFAULT_MATCH_THRESHOLD
+from .stats import COUNT_BUCKETS, Instrumentation, timed
+from .store import ItemStore, ShoppingItem, normalize_name, parse_rows
+
+ATTR_LIST = "list"
 ATTR_NAME = "name"
+ATTR_NAMES = "names"
+ATTR_SORT = "sort"
+
+SORT_STORE = "store"
+
+CONF_ACCOUNTS = "accounts"
+CONF_AISLE_ORDER = "aisle_order"
+CONF_API_URL = "api_url"
+CONF_ARTICLE_GROUPS = "article_groups"
+CONF_ARTICLE_GROUPS_FILE = "article_groups_file"
+CONF_CONNECT_TIMEOUT = "connect_timeout"
+CONF_DEDUP_WINDOW = "dedup_window"
+CONF_FAILURE_THRESHOLD = "failure_threshold"
+CONF_INSTRUMENTATION = "instrumentation"
+CONF_LISTNAME = "listname"
+CONF_LISTS = "lists"
+CONF_MATCH_THRESHOLD = "match_threshold"
+CONF_MAX_CONCURRENCY = "max_concurrency"
+CONF_MAX_POLL_INTERVAL = "max_poll_interval"
+CONF_MIN_POLL_INTERVAL = "min_poll_interval"
+CONF_RECOVERY_TIMEOUT = "recovery_timeout"
+CONF_RETRIES = "retries"
+CONF_STORESORTING = "storesorting"
+CONF_SYNC_DELAY = "sync_delay"
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_DEDUP_WINDOW = 5
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_POLL_INTERVAL = 900
+DEFAULT_MIN_POLL_INTERVAL = 30
+DEFAULT_SYNC_DELAY = 0.1
 
 DOMAIN = "ica_shopping_list"
+DATA_BREAKER = f"{DOMAIN}_breaker"
+DATA_STATS = f"{DOMAIN}_stats"
 _LOGGER = logging.getLogger(__name__)
-CONFIG_SCHEMA = vol.Schema({
-  DOMAIN: {
+
+
+def _merge_accounts(conf):
+    """Merge the single account and list keys into the accounts list."""
+    accounts = list(conf[CONF_ACCOUNTS])
+    if CONF_USERNAME in conf:
+        if CONF_LISTNAME not in conf:
+            raise vol.Invalid("listname is required together with username")
+        accounts.insert(0, {
+            CONF_USERNAME: conf[CONF_USERNAME],
+            CONF_PASSWORD: conf[CONF_PASSWORD],
+            CONF_LISTS: [
+                {
+                    CONF_LISTNAME: conf[CONF_LISTNAME],
+                    CONF_STORESORTING: conf[CONF_STORESORTING],
+                    CONF_AISLE_ORDER: [],
+                }
+            ],
+        })
+    if not accounts:
+        raise vol.Invalid("at least one account is required")
+    names = [lst[CONF_LISTNAME] for account in accounts for lst in account[CONF_LISTS]]
+    if len(names) != len(set(names)):
+        raise vol.Invalid("listname must be unique across accounts")
+    # The snapshot and journal of a list, and the login of an account, are
+    # stored in files named by slug
+    if len(names) != len({slugify(name) for name in names}):
+        raise vol.Invalid("listname must be unique across accounts ignoring case and accents")
+    usernames = [account[CONF_USERNAME] for account in accounts]
+    if len(usernames) != len({slugify(username) for username in usernames}):
+        raise vol.Invalid("username must be unique ignoring case and accents")
+    conf[CONF_ACCOUNTS] = accounts
+    return conf
+
+
+LIST_SCHEMA = vol.Schema({
+    vol.Required(CONF_LISTNAME): cv.string,
+    vol.Optional(CONF_STORESORTING, default=0): cv.positive_int,
+    vol.Optional(CONF_AISLE_ORDER, default=[]): vol.All(cv.ensure_list, [cv.positive_int]),
+})
+
+ACCOUNT_SCHEMA = vol.Schema({
     vol.Required(CONF_USERNAME): cv.string,
     vol.Required(CONF_PASSWORD): cv.string,
-  },
-}, extra=vol.ALLOW_EXTRA)
+    vol.Required(CONF_LISTS): vol.All(cv.ensure_list, [LIST_SCHEMA]),
+})
 
-icaUser = None
-icaPassword = None
-icaList = None
-icaStoreSort = None #default store sorting
+CONFIG_SCHEMA = vol.Schema({
+  DOMAIN: vol.All({
+    vol.Inclusive(CONF_USERNAME, "account"): cv.string,
+    vol.Inclusive(CONF_PASSWORD, "account"): cv.string,
+    vol.Optional(CONF_LISTNAME): cv.string,
+    vol.Optional(CONF_STORESORTING, default=0): cv.positive_int,
+    vol.Optional(CONF_ACCOUNTS, default=[]): vol.All(cv.ensure_list, [ACCOUNT_SCHEMA]),
+    vol.Optional(CONF_ARTICLE_GROUPS, default={}): {cv.string: cv.positive_int},
+    vol.Optional(CONF_ARTICLE_GROUPS_FILE): cv.string,
+    vol.Optional(CONF_API_URL, default=API_URL): cv.url,
+    vol.Optional(CONF_TIMEOUT, default=DEFAULT_TIMEOUT): cv.positive_int,
+    vol.Optional(CONF_CONNECT_TIMEOUT, default=DEFAULT_CONNECT_TIMEOUT): cv.positive_int,
+    vol.Optional(CONF_SYNC_DELAY, default=DEFAULT_SYNC_DELAY): vol.All(
+        vol.Coerce(float), vol.Range(min=0)
+    ),
+    vol.Optional(CONF_DEDUP_WINDOW, default=DEFAULT_DEDUP_WINDOW): vol.All(
+        vol.Coerce(float), vol.Range(min=0)
+    ),
+    vol.Optional(CONF_MATCH_THRESHOLD, default=DEFAULT_MATCH_THRESHOLD): vol.All(
+        vol.Coerce(float), vol.Range(min=0, max=1)
+    ),
+    vol.Optional(CONF_MAX_CONCURRENCY, default=DEFAULT_MAX_CONCURRENCY): vol.All(
+        vol.Coerce(int), vol.Range(min=1)
+    ),
+    vol.Optional(CONF_INSTRUMENTATION, default=False): cv.boolean,
+    vol.Optional(CONF_MIN_POLL_INTERVAL, default=DEFAULT_MIN_POLL_INTERVAL): cv.positive_int,
+    vol.Optional(CONF_MAX_POLL_INTERVAL, default=DEFAULT_MAX_POLL_INTERVAL): cv.positive_int,
+    vol.Optional(CONF_RETRIES, default=DEFAULT_RETRIES): cv.positive_int,
+    vol.Optional(CONF_FAILURE_THRESHOLD, default=DEFAULT_FAILURE_THRESHOLD): vol.All(
+        vol.Coerce(int), vol.Range(min=1)
+    ),
+    vol.Optional(CONF_RECOVERY_TIMEOUT, default=DEFAULT_RECOVERY_TIMEOUT): cv.positive_int,
+  }, _merge_accounts),
+}, extra=vol.ALLOW_EXTRA)
 
 EVENT = "shopping_list_updated"
 INTENT_ADD_ITEM = "HassShoppingListAddItem"
 INTENT_LAST_ITEMS = "HassShoppingListLastItems"
 ITEM_UPDATE_SCHEMA = vol.Schema({"complete": bool, ATTR_NAME: str})
-PERSISTENCE = ".shopping_list.json"
+SNAPSHOT_STORAGE_KEY = DOMAIN + ".items.{}"
+SNAPSHOT_STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 1
+JOURNAL = ".shopping_list_{}.journal"
 
 SERVICE_ADD_ITEM = "add_item"
+SERVICE_ADD_ITEMS = "add_items"
 SERVICE_COMPLETE_ITEM = "complete_item"
+SERVICE_COMPLETE_ITEMS = "complete_items"
+SERVICE_REMOVE_ITEMS = "remove_items"
 
-SERVICE_ITEM_SCHEMA = vol.Schema({vol.Required(ATTR_NAME): vol.Any(None, cv.string)})
+SERVICE_ITEM_SCHEMA = vol.Schema({
+    vol.Required(ATTR_NAME): vol.Any(None, cv.string),
+    vol.Optional(ATTR_LIST): cv.string,
+})
+
+SERVICE_ITEMS_SCHEMA = vol.Schema({
+    vol.Required(ATTR_NAMES): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_LIST): cv.string,
+})
 
 WS_TYPE_SHOPPING_LIST_ITEMS = "shopping_list/items"
 WS_TYPE_SHOPPING_LIST_ADD_ITEM = "shopping_list/items/add"
 WS_TYPE_SHOPPING_LIST_UPDATE_ITEM = "shopping_list/items/update"
 WS_TYPE_SHOPPING_LIST_CLEAR_ITEMS = "shopping_list/items/clear"
+WS_TYPE_SHOPPING_LIST_BULK_ADD = "shopping_list/items/bulk_add"
+WS_TYPE_SHOPPING_LIST_BULK_COMPLETE = "shopping_list/items/bulk_complete"
+WS_TYPE_SHOPPING_LIST_BULK_REMOVE = "shopping_list/items/bulk_remove"
+WS_TYPE_SHOPPING_LIST_SUBSCRIBE = "shopping_list/subscribe"
+WS_TYPE_STATS = "ica_shopping_list/stats"
 
 SCHEMA_WEBSOCKET_ITEMS = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
-    {vol.Required("type"): WS_TYPE_SHOPPING_LIST_ITEMS}
+    {
+        vol.Required("type"): WS_TYPE_SHOPPING_LIST_ITEMS,
+        vol.Optional(ATTR_LIST): str,
+        vol.Optional(ATTR_SORT): vol.In((SORT_STORE,)),
+    }
 )
 
 SCHEMA_WEBSOCKET_ADD_ITEM = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
-    {vol.Required("type"): WS_TYPE_SHOPPING_LIST_ADD_ITEM, vol.Required("name"): str}
+    {
+        vol.Required("type"): WS_TYPE_SHOPPING_LIST_ADD_ITEM,
+        vol.Required("name"): str,
+        vol.Optional(ATTR_LIST): str,
+    }
 )
 
 SCHEMA_WEBSOCKET_UPDATE_ITEM = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
@@ -65,51 +221,184 @@ SCHEMA_WEBSOCKET_UPDATE_ITEM = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
         vol.Required("item_id"): str,
         vol.Optional("name"): str,
         vol.Optional("complete"): bool,
+        vol.Optional(ATTR_LIST): str,
     }
 )
 
 SCHEMA_WEBSOCKET_CLEAR_ITEMS = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
-    {vol.Required("type"): WS_TYPE_SHOPPING_LIST_CLEAR_ITEMS}
+    {vol.Required("type"): WS_TYPE_SHOPPING_LIST_CLEAR_ITEMS, vol.Optional(ATTR_LIST): str}
+)
+
+SCHEMA_WEBSOCKET_SUBSCRIBE = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
+    {vol.Required("type"): WS_TYPE_SHOPPING_LIST_SUBSCRIBE, vol.Optional(ATTR_LIST): str}
+)
+
+SCHEMA_WEBSOCKET_STATS = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
+    {vol.Required("type"): WS_TYPE_STATS}
+)
+
+SCHEMA_WEBSOCKET_BULK = websocket_api.BASE_COMMAND_MESSAGE_SCHEMA.extend(
+    {
+        vol.Required("type"): vol.In(
+            (
+                WS_TYPE_SHOPPING_LIST_BULK_ADD,
+                WS_TYPE_SHOPPING_LIST_BULK_COMPLETE,
+                WS_TYPE_SHOPPING_LIST_BULK_REMOVE,
+            )
+        ),
+        vol.Required(ATTR_NAMES): [str],
+        vol.Optional(ATTR_LIST): str,
+    }
 )
 
 #changed from @asyncio.coroutine to async, added await 
 async def async_setup(hass, config):
     """Initialize the shopping list."""
-    global icaUser
-    icaUser = config["ica_shopping_list"]["username"]
-    global icaPassword
-    icaPassword = config["ica_shopping_list"]["password"]
-    global icaList
-    icaList = config["ica_shopping_list"]["listname"]
-    #added storesorting
-    global icaStoreSort
-    icaStoreSort = config["ica_shopping_list"]["storesorting"]
+    conf = config[DOMAIN]
+    setup_start = time.monotonic()
 
     #debug cofig/secrets
     #_LOGGER.debug(config)
 
+    session = async_create_session(conf[CONF_TIMEOUT], conf[CONF_CONNECT_TIMEOUT])
+
+    async def async_close_session(event):
+        """Stop polling and close the pooled ICA session on shutdown."""
+        for data in lists.values():
+            data.poller.async_stop()
+        await session.close()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_session)
+
+    user_path = conf.get(CONF_ARTICLE_GROUPS_FILE)
+    classifier = await hass.async_add_executor_job(
+        ArticleGroupClassifier.from_files,
+        None if user_path is None else hass.config.path(user_path),
+        conf[CONF_ARTICLE_GROUPS],
+    )
+
+    stats = hass.data[DATA_STATS] = Instrumentation(conf[CONF_INSTRUMENTATION])
+    semaphore = asyncio.Semaphore(conf[CONF_MAX_CONCURRENCY])
+    breaker = hass.data[DATA_BREAKER] = CircuitBreaker(
+        conf[CONF_FAILURE_THRESHOLD], conf[CONF_RECOVERY_TIMEOUT]
+    )
+    accounts = []
+    lists = hass.data[DOMAIN] = {}
+    for account_conf in conf[CONF_ACCOUNTS]:
+        account = IcaAccount(
+            hass,
+            session,
+            account_conf[CONF_USERNAME],
+            account_conf[CONF_PASSWORD],
+            conf[CONF_API_URL].rstrip("/"),
+            stats,
+            breaker,
+            conf[CONF_RETRIES],
+        )
+        accounts.append(account)
+        for list_conf in account_conf[CONF_LISTS]:
+            client = Connect(account, list_conf[CONF_LISTNAME], list_conf[CONF_STORESORTING])
+            data = lists[client.listName] = ShoppingData(
+                hass,
+                client,
+                classifier,
+                conf[CONF_SYNC_DELAY],
+                semaphore,
+                conf[CONF_DEDUP_WINDOW],
+                conf[CONF_MATCH_THRESHOLD],
+                list_conf[CONF_AISLE_ORDER],
+            )
+            data.poller = ListPoller(
+                hass,
+                data,
+                conf[CONF_MIN_POLL_INTERVAL],
+                max(conf[CONF_MIN_POLL_INTERVAL], conf[CONF_MAX_POLL_INTERVAL]),
+            )
+
+    async def async_load_lists():
+        """Load the stored tickets, snapshots and journals."""
+        start = time.monotonic()
+        results = await asyncio.gather(
+            *(account.async_load() for account in accounts),
+            *(data.async_load() for data in lists.values()),
+            return_exceptions=True,
+        )
+        for account, result in zip(accounts, results):
+            if isinstance(result, Exception):
+                _LOGGER.error("Failed to load the stored login of %s: %s", account.username, result)
+        _LOGGER.debug("Loaded %d lists in %.3f seconds", len(lists), time.monotonic() - start)
+
+    load_task = hass.async_create_task(async_load_lists())
+
+    async def async_reconcile_lists(event=None):
+        """Bring every list up to date with ICA and start polling."""
+        await load_task
+        start = time.monotonic()
+        results = await asyncio.gather(
+            *(data.async_reconcile() for data in lists.values()), return_exceptions=True
+        )
+        for name, result in zip(lists, results):
+            if isinstance(result, Exception):
+                _LOGGER.error("Failed to fetch %s from ICA", name, exc_info=result)
+        _LOGGER.debug("Fetched %d lists from ICA in %.3f seconds", len(lists), time.monotonic() - start)
+        for data in lists.values():
+            data.poller.async_start()
+
+    # Do not hold up the start of Home Assistant with requests to ICA
+    if hass.is_running:
+        hass.async_create_task(async_reconcile_lists())
+    else:
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STARTED, async_reconcile_lists)
+
     async def add_item_service(call):
         """Add an item with `name`."""
-        data = hass.data[DOMAIN]
+        data = async_get_list(hass, call.data.get(ATTR_LIST))
         name = call.data.get(ATTR_NAME)
-        if name is not None:
+        if data is None:
+            _LOGGER.error("Shopping list %s cannot be found", call.data.get(ATTR_LIST))
+        elif name is not None:
+            await data.async_wait_loaded()
             item_result = await data.async_add(name)
 
     async def complete_item_service(call):
         """Mark the item provided via `name` as completed."""
-        data = hass.data[DOMAIN]
+        data = async_get_list(hass, call.data.get(ATTR_LIST))
         name = call.data.get(ATTR_NAME)
+        if data is None:
+            _LOGGER.error("Shopping list %s cannot be found", call.data.get(ATTR_LIST))
+            return
         if name is None:
             return
-        try:
-            item = [item for item in data.items if item["name"] == name][0]
-        except IndexError:
+        await data.async_wait_loaded()
+        item = data.find_item(name)
+        if item is None:
             _LOGGER.error("Removing of item failed: %s cannot be found", name)
         else:
-           await data.async_update(item["id"], {"name": name, "complete": True})
-
-    data = hass.data[DOMAIN] = ShoppingData(hass)
-    await data.async_load()
+           await data.async_update(item.id, {"complete": True})
+
+    async def bulk_service(call):
+        """Add, complete or remove the items provided via `names` and return a result per name."""
+        data = async_get_list(hass, call.data.get(ATTR_LIST))
+        if data is None:
+            _LOGGER.error("Shopping list %s cannot be found", call.data.get(ATTR_LIST))
+            return {
+                "results": [
+                    _result(name, None, "list_not_found") for name in call.data[ATTR_NAMES]
+                ]
+            }
+        handler = {
+            SERVICE_ADD_ITEMS: data.async_add_items,
+            SERVICE_COMPLETE_ITEMS: data.async_complete_items,
+            SERVICE_REMOVE_ITEMS: data.async_remove_items,
+        }[call.service]
+        await data.async_wait_loaded()
+        results = await handler(call.data[ATTR_NAMES])
+        for result in results:
+            if not result["success"]:
+                _LOGGER.error(
+                    "%s failed for %s: %s", call.service, result["name"], result["error"]
+                )
+        return {"results": results}
 
     intent.async_register(hass, AddItemIntent())
     intent.async_register(hass, ListTopItemsIntent())
@@ -120,6 +409,14 @@ async def async_setup(hass, config):
     hass.services.async_register(
         DOMAIN, SERVICE_COMPLETE_ITEM, complete_item_service, schema=SERVICE_ITEM_SCHEMA
     )
+    for service in (SERVICE_ADD_ITEMS, SERVICE_COMPLETE_ITEMS, SERVICE_REMOVE_ITEMS):
+        hass.services.async_register(
+            DOMAIN,
+            service,
+            bulk_service,
+            schema=SERVICE_ITEMS_SCHEMA,
+            supports_response=SupportsResponse.OPTIONAL,
+        )
 
     hass.http.register_view(ShoppingListView)
     hass.http.register_view(CreateShoppingListItemView)
@@ -146,160 +443,581 @@ async def async_setup(hass, config):
         websocket_handle_clear,
         SCHEMA_WEBSOCKET_CLEAR_ITEMS,
     )
+    for ws_type in (
+        WS_TYPE_SHOPPING_LIST_BULK_ADD,
+        WS_TYPE_SHOPPING_LIST_BULK_COMPLETE,
+        WS_TYPE_SHOPPING_LIST_BULK_REMOVE,
+    ):
+        hass.components.websocket_api.async_register_command(
+            ws_type, websocket_handle_bulk, SCHEMA_WEBSOCKET_BULK
+        )
+    hass.components.websocket_api.async_register_command(
+        WS_TYPE_SHOPPING_LIST_SUBSCRIBE,
+        websocket_handle_subscribe,
+        SCHEMA_WEBSOCKET_SUBSCRIBE,
+    )
+    hass.components.websocket_api.async_register_command(
+        WS_TYPE_STATS, websocket_handle_stats, SCHEMA_WEBSOCKET_STATS
+    )
 
-    #Connect.authenticate(icaUser, icaPassword)
-
+    if stats.enabled:
+        hass.async_create_task(
+            discovery.async_load_platform(hass, "sensor", DOMAIN, {}, config)
+        )
 
+    _LOGGER.debug("Set up in %.3f seconds", time.monotonic() - setup_start)
     return True
 
 
+@callback
+def async_get_list(hass, name=None):
+    """Return the shopping list called name, the first list if name is None."""
+    lists = hass.data[DOMAIN]
+    if name is None:
+        return next(iter(lists.values()))
+    return lists.get(name)
+
+
 class ShoppingData:
     """Class to hold shopping list data."""
 
-    def __init__(self, hass):
+    def __init__(
+        self,
+        hass,
+        client,
+        classifier,
+        sync_delay=DEFAULT_SYNC_DELAY,
+        semaphore=None,
+        dedup_window=DEFAULT_DEDUP_WINDOW,
+        match_threshold=DEFAULT_MATCH_THRESHOLD,
+        aisle_order=(),
+    ):
         """Initialize the shopping list."""
         self.hass = hass
-        self.items = []
+        self.client = client
+        self.classifier = classifier
+        self.stats = client.account.stats
+        self.name = client.listName
+        self._store = ItemStore(aisle_order=aisle_order)
+        self._sync_delay = sync_delay
+        self._dedup_window = dedup_window
+        self._recent_adds = {}
+        self._match_threshold = match_threshold
+        self._semaphore = semaphore or asyncio.Semaphore(DEFAULT_MAX_CONCURRENCY)
+        self._batch = None
+        self._pending = SyncBatch()
+        self._flushing = []
+        self._sending = None
+        self._remote = None
+        self._send_lock = asyncio.Lock()
+        self._journal_lock = asyncio.Lock()
+        self._offline = False
+        self._listeners = []
+        self.loaded = False
+        self._loaded = asyncio.Event()
+        self.poller = None
+        self._snapshot = Store(
+            hass, SNAPSHOT_STORAGE_VERSION, SNAPSHOT_STORAGE_KEY.format(slugify(self.name))
+        )
+        self._journal = MutationJournal(hass.config.path(JOURNAL.format(slugify(self.name))))
+        self._etag_prefix = uuid.uuid4().hex[:12]
+
+    @property
+    def items(self):
+        """Return the items in list order."""
+        return self._store.items
+
+    async def async_wait_loaded(self):
+        """Wait until the last known items have been loaded."""
+        await self._loaded.wait()
 
     @callback
-    async def async_add(self, name):
-        """Add a shopping list item."""
-        self.items = []
-        # Await the async_add coroutine and store its result in item
-        #item_async = await self.async_add(info.get("name"))
-        # Now you can serialize item to JSON
-        
-        articleGroups = {"Välling":9,"Kaffe":9,"Maskindiskmedel":11,"Hushållspapper":11,"Toapapper":11,"Blöjor":11}
-        
-        articleGroup = articleGroups.get(name, 12)
-        
-        item = json.dumps({"CreatedRows":[{"IsStrikedOver": "false", "ProductName": name, "SourceId": -1, "ArticleGroupId":articleGroup}]})
-        _LOGGER.debug("Item: " + str(item))
-        URI = "/api/user/offlineshoppinglists"
-        api_data = await Connect.post_request(URI, item,"/sync")
-        
-        if api_data is not None and "Rows" in api_data:
-            _LOGGER.debug("Adding product: " + str(item))
-            for row in api_data["Rows"]:
-                name = row["ProductName"].capitalize()
-                uuid = row["OfflineId"]
-                complete = row["IsStrikedOver"]
-                source = row["SourceId"]
-    
-                item = {"name": name, "id": uuid, "complete": complete, "SourceId": source}
-                _LOGGER.debug("Item: " + str(item))
-                self.items.append(item)
-        else:
-            _LOGGER.error("Failed to get data from API, 180, async_add")
-    
-        _LOGGER.debug("Items: " + str(self.items))
-        return self.items
+    def async_add_listener(self, listener):
+        """Call listener with the added, changed and removed items of every change."""
+        self._listeners.append(listener)
+
+        @callback
+        def remove_listener():
+            """Stop calling the listener."""
+            self._listeners.remove(listener)
 
+        return remove_listener
+
+    def find_item(self, name):
+        """Return the item matching the name best, or None."""
+        return self._store.match(name, self._match_threshold)
+
+    @callback
+    def async_sync(self, created=(), changed=(), deleted=()):
+        """Apply rows to the items at once and queue them for the next sync request.
+
+        Rows that could not be sent stay applied and in the journal and are
+        sent again once ICA can be reached; rows that ICA rejects are rolled
+        back.
+        """
+        if self.poller is not None:
+            self.poller.async_activity()
+        if self._batch is None:
+            self._batch = SyncBatch()
+            self.hass.async_create_task(self._async_flush(self._batch))
+        self._batch.add(created, changed, deleted)
+        # Mutations never await between reading and changing the items, so
+        # the event loop runs them one at a time
+        self._async_apply_rows(created, changed, deleted)
+
+    def _with_unsent(self, items):
+        """Return items with every mutation ICA has not accepted yet applied."""
+        for batch in (self._sending, self._pending, *self._flushing, self._batch):
+            if batch is not None:
+                items = batch.apply(items)
+        return items
+
+    async def _async_flush(self, batch):
+        """Journal and send a batch after the debounce window has passed."""
+        await asyncio.sleep(self._sync_delay)
+        if self._batch is batch:
+            self._batch = None
+
+        self._flushing.append(batch)
+        async with self._journal_lock:
+            try:
+                await self.hass.async_add_executor_job(self._journal.append, batch.payload())
+            except OSError as err:
+                _LOGGER.error("Failed to write %s: %s", self._journal.path, err)
+        self._flushing.remove(batch)
+        self._pending.merge(batch)
+
+        if self._offline:
+            _LOGGER.warning(
+                "ICA cannot be reached, changes to %s are kept until it can", self.name
+            )
+            return
+        await self._async_send_pending()
+
+    async def _async_send_pending(self):
+        """Send every pending mutation in one sync request.
+
+        If ICA rejects the request the rows are sent one at a time, so only
+        the rows it rejects are undone.
+        """
+        async with self._send_lock:
+            pending = self._pending
+            if not pending:
+                return True
+            self._pending = SyncBatch()
+            self._sending = pending
+            try:
+                try:
+                    rows = await self._async_post(pending)
+                    rejected = []
+                    unsent = pending if rows is None else SyncBatch()
+                except IcaRejectedError as err:
+                    if len(pending) == 1:
+                        rows, rejected, unsent = None, [pending], SyncBatch()
+                    else:
+                        _LOGGER.warning(
+                            "ICA rejected the changes to %s, sending them one at a time: %s",
+                            self.name,
+                            err,
+                        )
+                        rows, rejected, unsent = await self._async_post_rows(pending)
+            finally:
+                self._sending = None
+
+            if unsent:
+                unsent.merge(self._pending)
+                self._pending = unsent
+                self._offline = True
+            elif rows is not None:
+                self._offline = False
+            await self._async_write_journal()
+
+            if rejected:
+                _LOGGER.error(
+                    "ICA rejected these changes to %s, undoing them: %s",
+                    self.name,
+                    ", ".join(self._describe(batch) for batch in rejected),
+                )
+            if rows is not None:
+                self._async_apply_remote(parse_rows(rows))
+            elif rejected:
+                self._async_rollback()
+            return not (rejected or unsent)
+
+    async def _async_post_rows(self, batch):
+        """Send the rows of a batch one at a time.
+
+        Returns the Rows of the list after the last accepted row, or None,
+        the rejected rows, and the rows not sent because ICA could not be
+        reached.
+        """
+        rows = None
+        rejected = []
+        unsent = SyncBatch()
+        for row in batch.split():
+            if unsent:
+                unsent.merge(row)
+                continue
+            try:
+                result = await self._async_post(row)
+            except IcaRejectedError:
+                rejected.append(row)
+                continue
+            if result is None:
+                unsent.merge(row)
+            else:
+                rows = result
+        return rows, rejected, unsent
+
+    @timed("sync")
+    async def _async_post(self, batch):
+        """Send a batch in one sync request and return the Rows of the list.
+
+        Returns None if ICA could not be reached and raises IcaRejectedError
+        if it refused the batch.
+        """
+        item = dumps(batch.payload())
+        _LOGGER.debug("Sync: %s", item)
+        URI = "/api/user/offlineshoppinglists"
+        try:
+            async with self._semaphore:
+                api_data = await self.client.post_request(URI, item, "/sync")
+        except IcaRejectedError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Failed to sync shopping list")
+            return None
+        if api_data is None or "Rows" not in api_data:
+            _LOGGER.error("Failed to get data from API, async_sync")
+            return None
+        return api_data["Rows"]
+
+    def _describe(self, batch):
+        """Return the name of the item a batch of one row changes, or its id."""
+        for row in (*batch.created.values(), *batch.changed.values()):
+            if "ProductName" in row:
+                return row["ProductName"]
+        item_id = next(iter((*batch.changed, *batch.deleted)))
+        item = self._store.get(item_id)
+        return item_id if item is None else item.name
 
+    @callback
+    def _async_rollback(self):
+        """Return to the items last fetched from ICA and the mutations still unsent."""
+        if self._remote is None:
+            self.hass.async_create_task(self.async_reconcile())
+        else:
+            self._async_apply(self._with_unsent(self._remote))
+
+    async def _async_write_journal(self):
+        """Rewrite the journal with the mutations that are still pending.
+
+        Appends and rewrites take turns, and the pending mutations are read
+        once it is our turn, so a batch appended meanwhile is not lost.
+        """
+        async with self._journal_lock:
+            try:
+                await self.hass.async_add_executor_job(
+                    self._journal.rewrite, self._pending.payload()
+                )
+            except OSError as err:
+                _LOGGER.error("Failed to write %s: %s", self._journal.path, err)
+
+    def _create_row(self, name):
+        """Return the sync row that creates an item."""
+        articleGroup = self.classifier.classify(name)
+
+        item = {"OfflineId": str(uuid.uuid4()), "IsStrikedOver": "false", "ProductName": name, "SourceId": -1, "ArticleGroupId":articleGroup}
+        _LOGGER.debug("Adding product: " + str(item))
+        return item
+
+    def _recent_add(self, name):
+        """Return the item added with the same name within the dedup window, or None."""
+        entry = self._recent_adds.get(normalize_name(name))
+        if entry is None or time.monotonic() - entry[1] >= self._dedup_window:
+            return None
+        item = self._store.get(entry[0])
+        if item is None or item.complete:
+            return None
+        _LOGGER.debug("%s was just added, not adding it again", name)
+        self.stats.increment("deduplicated")
+        return item
+
+    def _remember_adds(self, rows):
+        """Remember added rows by name and forget adds older than the dedup window."""
+        now = time.monotonic()
+        recent = self._recent_adds
+        for key, (_, added) in list(recent.items()):
+            if now - added < self._dedup_window:
+                break
+            del recent[key]
+        for row in rows:
+            key = normalize_name(row["ProductName"])
+            recent.pop(key, None)
+            recent[key] = (row["OfflineId"], now)
+
+    @timed("add")
+    @callback
+    async def async_add(self, name):
+        """Add a shopping list item unless it was just added and return it."""
+        item = self._recent_add(name)
+        if item is None:
+            row = self._create_row(name)
+            self._remember_adds([row])
+            self.async_sync(created=[row])
+            return self._store.get(row["OfflineId"]).as_dict()
+        return item.as_dict()
+
+    @timed("add_items")
+    async def async_add_items(self, names):
+        """Add items in one sync request and return a result per name.
+
+        Names added within the dedup window return the item already added.
+        """
+        items = [self._recent_add(name) for name in names]
+        rows = {
+            index: self._create_row(name)
+            for index, (name, item) in enumerate(zip(names, items))
+            if item is None
+        }
+        if rows:
+            self._remember_adds(rows.values())
+            self.async_sync(created=list(rows.values()))
+        for index, row in rows.items():
+            items[index] = self._store.get(row["OfflineId"])
+        return [_result(name, item, "not_added") for name, item in zip(names, items)]
+
+    @timed("complete_items")
+    async def async_complete_items(self, names):
+        """Complete items in one sync request and return a result per name."""
+        found = self._find_items(names, True)
+        changed = [
+            {"OfflineId": item.id, "IsStrikedOver": True, "SourceId": -1}
+            for item in found if item is not None and not item.complete
+        ]
+        if changed:
+            self.async_sync(changed=changed)
+        results = []
+        for name, item in zip(names, found):
+            if item is None:
+                results.append(_result(name, None, "not_found"))
+            else:
+                item = self._store.get(item.id)
+                if item is not None and not item.complete:
+                    item = None
+                results.append(_result(name, item, "not_completed"))
+        return results
+
+    @timed("remove_items")
+    async def async_remove_items(self, names):
+        """Remove items in one sync request and return a result per name.
+
+        Names are not matched by similarity, so a near miss removes nothing.
+        """
+        found = self._find_items(names, False)
+        deleted = [item.id for item in found if item is not None]
+        if deleted:
+            self.async_sync(deleted=deleted)
+        results = []
+        for name, item in zip(names, found):
+            if item is None:
+                results.append(_result(name, None, "not_found"))
+            elif item.id in self._store:
+                results.append(_result(name, None, "not_removed"))
+            else:
+                results.append(_result(name, item, None))
+        return results
+
+    def _find_items(self, names, similar):
+        """Return the item for every name, or None, using each item at most once.
+
+        Names only match by similarity if similar is true.
+        """
+        found = []
+        seen = set()
+        for name in names:
+            if similar:
+                item = self._store.match(name, self._match_threshold, seen)
+            else:
+                item = self._store.find_folded(name, seen)
+            if item is not None:
+                seen.add(item.id)
+            found.append(item)
+        return found
+
+
+    @timed("update")
     @callback
     async def async_update(self, item_id, info):
-        """Update a shopping list item."""
+        """Update a shopping list item and return it."""
+
+        _LOGGER.debug("Update %s: %s", item_id, info)
+        if item_id not in self._store:
+            raise KeyError(item_id)
+        item = {"OfflineId": item_id, "SourceId": -1}
 
-        _LOGGER.debug("Info 200: " + str(item_id) +" - "+ str(info))
-        self.items = []
-        
         if info.get("complete") == True or info.get("complete") == False:
-            
-            # Await the async_add coroutine and store its result in item
-            #completed = await self.async_add(info.get("completed"))
-            _LOGGER.debug('complete???' + str(info.get("complete")))
-            completed = info.get("complete")
-            # Now you can serialize item to JSON
-            item = json.dumps({"ChangedRows": [{"OfflineId": item_id, "IsStrikedOver": completed, "SourceId": -1}]})
+            item["IsStrikedOver"] = info.get("complete")
         elif info.get("name"):
-            # Await the async_add coroutine and store its result in item
-            item_name = await self.async_add(info.get("name"))
-            # Now you can serialize item to JSON
-            item = json.dumps({"ChangedRows": [{"OfflineId": item_id, "ProductName": item_name, "SourceId": -1}]})
-        _LOGGER.debug("Item 214: " + str(item))
+            item["ProductName"] = info.get("name")
+        _LOGGER.debug("Updating product: " + str(item))
 
-        URI = "/api/user/offlineshoppinglists"
-        api_data = await Connect.post_request(URI, item,"/sync")
-        
-        if api_data is not None and "Rows" in api_data:
-            _LOGGER.debug("Updating product: " + str(item))
-            for row in api_data["Rows"]:
-                name = row["ProductName"].capitalize()
-                uuid = row["OfflineId"]
-                complete = row["IsStrikedOver"]
-                source = row["SourceId"]
-                
-                item = {"name": name, "id": uuid, "complete": complete, "SourceId": source}
-                _LOGGER.debug("Item: " + str(item))
-                self.items.append(item)
-    
-        _LOGGER.debug("Items: " + str(self.items))
-        return self.items
+        self.async_sync(changed=[item])
+        return self._store.get(item_id).as_dict()
 
 
+    @timed("clear_completed")
     @callback
     async def async_clear_completed(self):
         """Clear completed items."""
         completed_items = []
 
         for c_item in self.items:
-            if c_item["complete"] == True:
-                completed_items.append(c_item["id"])
+            if c_item.complete == True:
+                completed_items.append(c_item.id)
         _LOGGER.debug("Items to delete: " + str(completed_items))
 
-        self.items = []
-        item = json.dumps({ "DeletedRows": completed_items })
-        _LOGGER.debug("Item: " + str(item))
+        if completed_items:
+            self.async_sync(deleted=completed_items)
+        return self.as_dicts()
 
+    async def async_load(self):
+        """Load the last known items and the mutations not yet sent.
+
+        The list counts as loaded even if they cannot be read, so nothing
+        waits for it forever; it is filled in from ICA instead.
+        """
+        try:
+            items = await self._async_load_snapshot()
+            try:
+                self._pending = await self.hass.async_add_executor_job(self._journal.load)
+            except OSError as err:
+                _LOGGER.error("Failed to load %s: %s", self._journal.path, err)
+            if self._pending:
+                _LOGGER.info("Changes to %s not yet sent to ICA will be sent again", self.name)
+            self._store.replace(self._with_unsent(items))
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Failed to load the last known items of %s", self.name)
+        finally:
+            self.loaded = True
+            self._loaded.set()
+
+    async def _async_load_snapshot(self):
+        """Return the last known items, or none if they cannot be read."""
+        try:
+            data = await self._snapshot.async_load() or []
+            items = [ShoppingItem.from_dict(item) for item in data]
+        except (HomeAssistantError, AttributeError, KeyError, TypeError) as err:
+            _LOGGER.error("Failed to load the last known items of %s: %s", self.name, err)
+            return []
+        _LOGGER.debug("Loaded %d items of %s from snapshot", len(items), self.name)
+        return items
+
+    @timed("reconcile")
+    async def async_reconcile(self):
+        """Fetch the list from ICA and apply the differences.
+
+        Returns if anything changed, or None if the list could not be fetched.
+        """
         URI = "/api/user/offlineshoppinglists"
-        api_data = await Connect.post_request(URI, item,"/sync")
-        _LOGGER.debug("Adding product: " + str(api_data))
-        for row in api_data["Rows"]:
-            name = row["ProductName"].capitalize()
-            uuid = row["OfflineId"]
-            complete = row["IsStrikedOver"]
-            source = row["SourceId"]
-            
-            item = {"name": name, "id": uuid, "complete": complete, "SourceId": source}
-            _LOGGER.debug("Item: " + str(item))
-            self.items.append(item)
-
-        _LOGGER.debug("Items: " + str(self.items))
-        return self.items
+        try:
+            async with self._semaphore:
+                api_data = await self.client.get_request(URI)
+        except IcaRejectedError as err:
+            _LOGGER.error("Failed to load shopping list data: %s", err)
+            return None
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Failed to load shopping list data")
+            return None
+        _LOGGER.debug(api_data)
+
+        if api_data is None or "Rows" not in api_data:
+            _LOGGER.error("Failed to load shopping list data")
+            return None
+
+        changed = self._async_apply_remote(parse_rows(api_data["Rows"]))
+        if self._pending:
+            self._offline = False
+            version = self.version
+            await self._async_send_pending()
+            changed = changed or self.version != version
+        return changed
 
-    async def async_load(self):
-        """Load items."""
-
-        async def load():
-            """Load the items synchronously."""
-            URI = "/api/user/offlineshoppinglists"
-            api_data = await Connect.get_request(URI)
-            _LOGGER.debug(api_data)
-            
-            if api_data is None:
-                _LOGGER.error("Failed to load shopping list data")
-                return
-            
-            _LOGGER.debug("Adding to ica: " + str(api_data))
-            for row in api_data["Rows"]:
-                name = row["ProductName"].capitalize()
-                uuid = row["OfflineId"]
-                complete = row["IsStrikedOver"]
-                source = row["SourceId"]
-
-                item = {"name": name, "id": uuid, "complete": complete, "SourceId": source}
-                _LOGGER.debug("Item: " + str(item))
-                self.items.append(item)
-
-            _LOGGER.debug("Items: " + str(self.items))
-            return self.items
-#            return load_json(self.hass.config.path(PERSISTENCE), default=[])
-
-        self.items = await self.hass.async_add_job(load)
-
-    def save(self):
-        """Save the items."""
-        save_json(self.hass.config.path(PERSISTENCE), self.items)
+    @callback
+    def _async_apply_remote(self, items):
+        """Apply items returned by ICA on top of which the unsent mutations stay applied."""
+        self.stats.observe("rows", len(items), COUNT_BUCKETS)
+        self._remote = items
+        return self._async_apply(self._with_unsent(items))
+
+    @callback
+    def _async_apply(self, items):
+        """Make the items match, notify and persist them if anything changed."""
+        return self._async_changed(*self._store.apply(items))
+
+    @callback
+    def _async_apply_rows(self, created=(), changed=(), deleted=()):
+        """Apply sync rows, touching only the items they name, and notify the changes."""
+        store = self._store
+        added = []
+        updated = []
+        removed = []
+        for row in created:
+            item = ShoppingItem.from_row(row)
+            store.add(item)
+            added.append(item)
+        for row in changed:
+            old = store.get(row["OfflineId"])
+            if old is None:
+                continue
+            item = old.updated(row)
+            if item != old:
+                store.add(item)
+                updated.append(item)
+        for item_id in deleted:
+            if item_id in store:
+                removed.append(store.remove(item_id))
+        return self._async_changed(added, updated, removed)
+
+    @callback
+    def _async_changed(self, added, changed, removed):
+        """Notify and persist the items if anything changed."""
+        if not (added or changed or removed):
+            return False
+        _LOGGER.debug(
+            "Added %d, changed %d, removed %d items", len(added), len(changed), len(removed)
+        )
+        for listener in list(self._listeners):
+            listener(added, changed, removed)
+        self.hass.bus.async_fire(EVENT)
+        # Store writes one file at a time and only the latest items
+        self._snapshot.async_delay_save(self._store.as_dicts, SNAPSHOT_SAVE_DELAY)
+        return True
+
+    @property
+    def version(self):
+        """Return a number that changes whenever the items change."""
+        return self._store.version
+
+    def etag(self, store_sorted=False):
+        """Return the entity tag of the current items."""
+        suffix = "-" + SORT_STORE if store_sorted else ""
+        return f'"{self._etag_prefix}-{self._store.version}{suffix}"'
+
+    def as_dicts(self, store_sorted=False):
+        """Return the JSON representation of the items."""
+        return self._store.as_dicts(store_sorted)
+
+    def as_json(self, store_sorted=False):
+        """Return the JSON representation of the items as bytes."""
+        return self._store.as_json(store_sorted)
+
+
+def _result(name, item, error):
+    """Return the result of a bulk operation for one name."""
+    if item is None:
+        return {"name": name, "success": False, "item": None, "error": error}
+    return {"name": name, "success": True, "item": item.as_dict(), "error": None}
 
 
 class AddItemIntent(intent.IntentHandler):
@@ -313,14 +1031,12 @@ class AddItemIntent(intent.IntentHandler):
         slots = self.async_validate_slots(intent_obj.slots)
         item = slots["item"]["value"]
 
-        # Await the async_add method to get the result
-        result = await intent_obj.hass.data[DOMAIN].async_add(item)
+        data = async_get_list(intent_obj.hass)
+        await data.async_wait_loaded()
+        await data.async_add(item)
 
         response = intent_obj.create_response()
-        item_result = await intent_obj.hass.data[DOMAIN].async_add(item)
-        response.async_set_speech(f"I've added {item_result} to your shopping list")
-
-        intent_obj.hass.bus.async_fire(EVENT)
+        response.async_set_speech(f"I've added {item} to your shopping list")
 
         # Return the result
         return response
@@ -334,7 +1050,9 @@ class ListTopItemsIntent(intent.IntentHandler):
 
     async def async_handle(self, intent_obj):
         """Handle the intent."""
-        items = intent_obj.hass.data[DOMAIN].items[-5:]
+        data = async_get_list(intent_obj.hass)
+        await data.async_wait_loaded()
+        items = data.items[-5:]
         response = intent_obj.create_response()
 
         if not items:
@@ -343,7 +1061,7 @@ class ListTopItemsIntent(intent.IntentHandler):
             response.async_set_speech(
                 "These are the top {} items on your shopping list: {}".format(
                     min(len(items), 5),
-                    ", ".join(itm["name"] for itm in reversed(items)),
+                    ", ".join(itm.name for itm in reversed(items)),
                 )
             )
         return response
@@ -358,7 +1076,24 @@ class ShoppingListView(http.HomeAssistantView):
     @callback
     def get(self, request):
         """Retrieve shopping list items."""
-        return self.json(request.app["hass"].data[DOMAIN].items)
+        data = async_get_list(request.app["hass"], request.query.get(ATTR_LIST))
+        if data is None:
+            return self.json_message("List not found", 404)
+        if not data.loaded:
+            return self.json_message("loading", 503)
+
+        store_sorted = request.query.get(ATTR_SORT) == SORT_STORE
+        etag = data.etag(store_sorted)
+        headers = {hdrs.ETAG: etag, hdrs.CACHE_CONTROL: "no-cache"}
+        if_none_match = request.headers.get(hdrs.IF_NONE_MATCH)
+        if if_none_match is not None and (
+            if_none_match.strip() == "*"
+            or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+        ):
+            return web.Response(status=304, headers=headers)
+        return web.Response(
+            body=data.as_json(store_sorted), content_type="application/json", headers=headers
+        )
 
 
 class UpdateShoppingListItemView(http.HomeAssistantView):
@@ -370,10 +1105,14 @@ class UpdateShoppingListItemView(http.HomeAssistantView):
     async def post(self, request, item_id):
         """Update a shopping list item."""
         data = await request.json()
+        shopping_list = async_get_list(request.app["hass"], request.query.get(ATTR_LIST))
+        if shopping_list is None:
+            return self.json_message("List not found", 404)
+        if not shopping_list.loaded:
+            return self.json_message("loading", 503)
 
         try:
-            item = request.app["hass"].data[DOMAIN].async_update(item_id, data)
-            request.app["hass"].bus.async_fire(EVENT)
+            item = await shopping_list.async_update(item_id, data)
             return self.json(item)
         except KeyError:
             return self.json_message("Item not found", 404)
@@ -390,8 +1129,12 @@ class CreateShoppingListItemView(http.HomeAssistantView):
     @RequestDataValidator(vol.Schema({vol.Required("name"): str}))
     async def post(self, request, data):
         """Create a new shopping list item."""
-        item = await request.app["hass"].data[DOMAIN].async_add(data["name"])
-        request.app["hass"].bus.async_fire(EVENT)
+        shopping_list = async_get_list(request.app["hass"], request.query.get(ATTR_LIST))
+        if shopping_list is None:
+            return self.json_message("List not found", 404)
+        if not shopping_list.loaded:
+            return self.json_message("loading", 503)
+        item = await shopping_list.async_add(data["name"])
         return self.json(item)
 
 
@@ -401,28 +1144,61 @@ class ClearCompletedItemsView(http.HomeAssistantView):
     url = "/api/shopping_list/clear_completed"
     name = "api:shopping_list:clear_completed"
 
-    @callback
-    def post(self, request):
+    async def post(self, request):
         """Retrieve if API is running."""
         hass = request.app["hass"]
-        hass.data[DOMAIN].async_clear_completed()
-        hass.bus.async_fire(EVENT)
+        data = async_get_list(hass, request.query.get(ATTR_LIST))
+        if data is None:
+            return self.json_message("List not found", 404)
+        if not data.loaded:
+            return self.json_message("loading", 503)
+        await data.async_clear_completed()
         return self.json_message("Cleared completed items.")
 
 
+def _list_not_found(connection, msg_id):
+    """Send an error for an unknown list."""
+    connection.send_message(
+        websocket_api.error_message(msg_id, "list_not_found", "List not found")
+    )
+
+
+@callback
+def _async_get_loaded_list(hass, connection, msg_id, name):
+    """Return the list, or send an error if it is unknown or not loaded yet."""
+    data = async_get_list(hass, name)
+    if data is None:
+        _list_not_found(connection, msg_id)
+        return None
+    if not data.loaded:
+        connection.send_message(
+            websocket_api.error_message(msg_id, "loading", "Shopping list is loading")
+        )
+        return None
+    return data
+
+
 @callback
 def websocket_handle_items(hass, connection, msg):
     """Handle get shopping_list items."""
+    data = _async_get_loaded_list(hass, connection, msg["id"], msg.get(ATTR_LIST))
+    if data is None:
+        return
+    # The items are serialized once per change, not once per client
     connection.send_message(
-        websocket_api.result_message(msg["id"], hass.data[DOMAIN].items)
+        websocket_api.messages.construct_result_message(
+            msg["id"], data.as_json(msg.get(ATTR_SORT) == SORT_STORE)
+        )
     )
 
 
-@callback
-def websocket_handle_add(hass, connection, msg):
+@websocket_api.async_response
+async def websocket_handle_add(hass, connection, msg):
     """Handle add item to shopping_list."""
-    item = hass.data[DOMAIN].async_add(msg["name"])
-    hass.bus.async_fire(EVENT)
+    data = _async_get_loaded_list(hass, connection, msg["id"], msg.get(ATTR_LIST))
+    if data is None:
+        return
+    item = await data.async_add(msg["name"])
     connection.send_message(websocket_api.result_message(msg["id"], item))
 
 
@@ -432,11 +1208,13 @@ async def websocket_handle_update(hass, connection, msg):
     msg_id = msg.pop("id")
     item_id = msg.pop("item_id")
     msg.pop("type")
+    shopping_list = _async_get_loaded_list(hass, connection, msg_id, msg.pop(ATTR_LIST, None))
     data = msg
+    if shopping_list is None:
+        return
 
     try:
-        item = hass.data[DOMAIN].async_update(item_id, data)
-        hass.bus.async_fire(EVENT)
+        item = await shopping_list.async_update(item_id, data)
         connection.send_message(websocket_api.result_message(msg_id, item))
     except KeyError:
         connection.send_message(
@@ -444,158 +1222,81 @@ async def websocket_handle_update(hass, connection, msg):
         )
 
 
-@callback
-def websocket_handle_clear(hass, connection, msg):
+@websocket_api.async_response
+async def websocket_handle_clear(hass, connection, msg):
     """Handle clearing shopping_list items."""
-    hass.data[DOMAIN].async_clear_completed()
-    hass.bus.async_fire(EVENT)
+    data = _async_get_loaded_list(hass, connection, msg["id"], msg.get(ATTR_LIST))
+    if data is None:
+        return
+    await data.async_clear_completed()
     connection.send_message(websocket_api.result_message(msg["id"]))
 
 
-class Connect:
-
-    AUTHTICKET = None
-    listId = None
-
-    def glob_user():
-        global icaUser
-        return icaUser
-
-    def glob_password():
-        global icaPassword
-        return icaPassword
-
-    def glob_list():
-        global icaList
-        return icaList
-        
-    def glob_icaStoreSort():
-        global icaStoreSort
-        return icaStoreSort
-
-    @staticmethod
-    async def get_request(uri):
-        """Do asynchronous API request."""
-        if Connect.AUTHTICKET is None:
-            renewTicket = await Connect.authenticate()  # Await authentication
-            
-            Connect.AUTHTICKET = renewTicket["authTicket"]
-            Connect.listId = renewTicket["listId"]
-        
-        url = "https://handla.api.ica.se" + uri + "/" + Connect.listId
-        headers = {"Content-Type": "application/json", "AuthenticationTicket": Connect.AUTHTICKET}
-        _LOGGER.debug("URL %s", url)
-         
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.get(url) as response:
-                if response.status == 401:
-                    # Handle authentication error
-                    _LOGGER.debug("API key expired. Acquire new")
-        
-                    renewTicket = await Connect.authenticate()  # Await authentication
-                    Connect.AUTHTICKET = renewTicket["authTicket"]
-                    Connect.listId = renewTicket["listId"]
-        
-                    # ... rest of your code
-                elif response.status != 200:
-                    _LOGGER.exception("API request returned error,476 %d", response.status)
-                else:
-                    _LOGGER.debug("API request returned OK %d", response.status)
-        
-                    json_data = await response.json()  # Await response content
-                    _LOGGER.debug(json_data)
-                    return json_data
-
-    @staticmethod
-    async def post_request(uri, data, ext):
-        """Do asynchronous API request."""
-        if Connect.AUTHTICKET is None:
-            renewTicket = await Connect.authenticate()  # Await authentication
-            Connect.AUTHTICKET = renewTicket["authTicket"]
-            Connect.listId = renewTicket["listId"]
-
-        url = "https://handla.api.ica.se" + uri + "/" + Connect.listId + ext #ext contains "/sync"
-        headers = {"Content-Type": "application/json", "AuthenticationTicket": Connect.AUTHTICKET}
-        _LOGGER.debug("URL %s", url)
-         
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.post(url, data=data) as response:
-                if response.status == 401:
-                    # Handle authentication error
-                    _LOGGER.debug("API key expired. Acquire new")
-
-                    renewTicket = await Connect.authenticate()  # Await authentication
-                    Connect.AUTHTICKET = renewTicket["authTicket"]
-                    Connect.listId = renewTicket["listId"]
-
-                    # ... rest of your code
-                elif response.status != 200:
-                    _LOGGER.exception("API request returned error, 506 %d", response.status)
-                else:
-                    _LOGGER.debug("API request returned OK %d", response.status)
-
-                    json_data = await response.json()  # Await response content
-                    _LOGGER.debug(json_data)
-                    return json_data
-
-    @staticmethod
-    async def authenticate():
-        """Do asynchronous API request"""
-
-        icaUser = Connect.glob_user()
-        icaPassword = Connect.glob_password()
-        icaList = Connect.glob_list()
-        listId = None
-        icaStoreSort = Connect.glob_icaStoreSort()
-
-        url = "https://handla.api.ica.se/api/login"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, auth=aiohttp.BasicAuth(icaUser, icaPassword)) as response:
-                if response.status != 200:
-                    _LOGGER.exception("API request returned error, 526 %d", response.status)
-                else:
-                    _LOGGER.debug("API request returned OK %d", response.status)
-                    authTick = response.headers["AuthenticationTicket"]
-
-                    if Connect.listId is None:
-                        url = 'https://handla.api.ica.se/api/user/offlineshoppinglists'
-                        headers = {"Content-Type": "application/json", "AuthenticationTicket": authTick}
-                        
-                        async with session.get(url, headers=headers) as response:
-                            response = await response.json()
-                            for lists in response["ShoppingLists"]:
-                                if lists["Title"] == icaList:
-                                    listId = lists["OfflineId"]
-                        
-                        if Connect.listId is None and listId is None:
-                            _LOGGER.info("Shopping-list not found: %s", icaList)
-                            newOfflineId = secrets.token_hex(4) + "-" + secrets.token_hex(2) + "-" + secrets.token_hex(2) + "-"
-                            newOfflineId = newOfflineId + secrets.token_hex(2) + "-" + secrets.token_hex(6)
-                            _LOGGER.debug("New hex-string: %s", newOfflineId)
-                            
-                            icaStoreSort = 0 if icaStoreSort is None else icaStoreSort
-                            
-                            data = json.dumps({"OfflineId": newOfflineId, "Title": icaList if listId is None else listId, "SortingStore": icaStoreSort})
-
-                            url = 'https://handla.api.ica.se/api/user/offlineshoppinglists'
-                            headers = {"Content-Type": "application/json", "AuthenticationTicket": authTick}
-                            
-                            _LOGGER.debug("List does not exist. Creating %s", icaList)
-
-                            async with session.post(url, headers=headers, data=data) as response:
-                                if response.status == 200:
-                                    url = 'https://handla.api.ica.se/api/user/offlineshoppinglists'
-                                    headers = {"Content-Type": "application/json", "AuthenticationTicket": authTick}
-
-                                    async with session.get(url, headers=headers) as response:
-                                        response = await response.json()
-
-                                        for lists in response["ShoppingLists"]:
-                                            if lists["Title"] == icaList:
-                                                listId = lists["OfflineId"]
-                                                _LOGGER.debug(icaList + " created with offlineId %s", listId)
-
-                    authResult = {"authTicket": authTick, "listId": listId}
-                    _LOGGER.debug("authTicket: %s", authTick)
-                    _LOGGER.debug("New listId: %s", listId)
-                    return authResult
+@websocket_api.async_response
+async def websocket_handle_bulk(hass, connection, msg):
+    """Handle adding, completing or removing several shopping_list items."""
+    data = _async_get_loaded_list(hass, connection, msg["id"], msg.get(ATTR_LIST))
+    if data is None:
+        return
+    handler = {
+        WS_TYPE_SHOPPING_LIST_BULK_ADD: data.async_add_items,
+        WS_TYPE_SHOPPING_LIST_BULK_COMPLETE: data.async_complete_items,
+        WS_TYPE_SHOPPING_LIST_BULK_REMOVE: data.async_remove_items,
+    }[msg["type"]]
+    results = await handler(msg[ATTR_NAMES])
+    connection.send_message(websocket_api.result_message(msg["id"], results))
+
+
+@callback
+def websocket_handle_stats(hass, connection, msg):
+    """Handle getting the instrumentation of the ICA shopping lists."""
+    lists = {
+        name: {"items": len(data.items), "poller": data.poller.stats}
+        for name, data in hass.data[DOMAIN].items()
+    }
+    connection.send_message(
+        websocket_api.result_message(
+            msg["id"],
+            {
+                "lists": lists,
+                "breaker": hass.data[DATA_BREAKER].stats,
+                **hass.data[DATA_STATS].as_dict(),
+            },
+        )
+    )
+
+
+@callback
+def websocket_handle_subscribe(hass, connection, msg):
+    """Handle subscribing to the changes of a shopping_list.
+
+    The first event holds all items; every following event holds only the
+    added and changed items and the ids of removed items.
+    """
+    msg_id = msg["id"]
+    data = _async_get_loaded_list(hass, connection, msg_id, msg.get(ATTR_LIST))
+    if data is None:
+        return
+
+    @callback
+    def forward_changes(added, changed, removed):
+        """Send the changes to the subscriber."""
+        connection.send_message(
+            websocket_api.event_message(
+                msg_id,
+                {
+                    "version": data.version,
+                    "added": [item.as_dict() for item in added],
+                    "changed": [item.as_dict() for item in changed],
+                    "removed": [item.id for item in removed],
+                },
+            )
+        )
+
+    connection.subscriptions[msg_id] = data.async_add_listener(forward_changes)
+    connection.send_message(websocket_api.result_message(msg_id))
+    connection.send_message(
+        websocket_api.event_message(
+            msg_id, {"version": data.version, "items": data.as_dicts()}
+        )
+    )
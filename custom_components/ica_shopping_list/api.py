@@ -0,0 +1,435 @@
+"""Client for the ICA shopping list API."""
+import asyncio
+import logging
+import random
+import secrets
+import time
+
+import aiohttp #handle http requests
+
+from homeassistant.helpers.storage import Store
+from homeassistant.util import slugify
+
+from .codec import dumps, loads
+from .stats import SIZE_BUCKETS, Instrumentation
+
+_LOGGER = logging.getLogger(__name__)
+
+API_URL = "https://handla.api.ica.se"
+CONNECTION_LIMIT_PER_HOST = 4
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+MIN_TICKET_LIFETIME = 60
+
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF = 0.5
+# Answered when ICA is busy, so sent again like server errors
+RETRY_STATUSES = (408, 429)
+# Answered when ICA refuses the content of a request
+REJECTED_STATUSES = (400, 422)
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIMEOUT = 60
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+LISTS_URI = "/api/user/offlineshoppinglists"
+
+STORAGE_KEY = "ica_shopping_list.auth"
+STORAGE_VERSION = 1
+
+
+def async_create_session(timeout, connect_timeout):
+    """Create the pooled session shared by all API requests."""
+    connector = aiohttp.TCPConnector(
+        limit_per_host=CONNECTION_LIMIT_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout, connect=connect_timeout),
+    )
+
+
+class IcaServerError(Exception):
+    """ICA answered with a server error."""
+
+
+class IcaRejectedError(Exception):
+    """ICA refused a request it received."""
+
+
+class IcaUnauthorizedError(Exception):
+    """ICA did not accept the ticket."""
+
+
+class IcaListError(Exception):
+    """ICA answered looking up or creating a list with an error."""
+
+
+class CircuitBreaker:
+    """Stop calling ICA after repeated failures.
+
+    After failure_threshold consecutive failures the breaker opens and
+    requests fail fast. Once recovery_timeout seconds have passed one probe
+    request is let through; its success closes the breaker and its failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, recovery_timeout=DEFAULT_RECOVERY_TIMEOUT):
+        """Initialize the breaker."""
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened = None
+        self._probing = False
+
+    @property
+    def stats(self):
+        """Return the state of the breaker."""
+        return {"state": self.state, "failures": self.failures, "opened": self.opened}
+
+    def allow_request(self):
+        """Return if a request may be sent."""
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN:
+            if time.monotonic() < self.opened + self.recovery_timeout:
+                return False
+            self.state = STATE_HALF_OPEN
+            _LOGGER.info("Probing if ICA can be reached again")
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        """Record a request that reached ICA."""
+        if self.state != STATE_CLOSED:
+            _LOGGER.info("ICA can be reached again")
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        """Record a request that failed because of ICA or the network."""
+        self.failures += 1
+        self._probing = False
+        if self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != STATE_OPEN:
+                _LOGGER.warning("ICA cannot be reached, pausing requests for %d seconds", self.recovery_timeout)
+            self.state = STATE_OPEN
+            self.opened = time.monotonic()
+
+
+class IcaAccount:
+    """Login ticket shared by every list of one ICA account."""
+
+    def __init__(
+        self,
+        hass,
+        session,
+        username,
+        password,
+        api_url=API_URL,
+        stats=None,
+        breaker=None,
+        retries=DEFAULT_RETRIES,
+    ):
+        """Initialize the account."""
+        self.session = session
+        self.api_url = api_url
+        self.stats = stats or Instrumentation()
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = retries
+        self.username = username
+        self._password = password
+        self.ticket = None
+        self.issued = None
+        self.lifetime = None
+        self.lists = {}
+        self._lock = asyncio.Lock()
+        self._store = Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{slugify(username)}")
+
+    async def async_load(self):
+        """Restore the ticket and list ids from the last run."""
+        data = await self._store.async_load() or {}
+        self.lists = data.get("lists", {})
+        self.issued = data.get("issued")
+        self.lifetime = data.get("lifetime")
+        if data.get("ticket") is not None and not self.ticket_expired():
+            self.ticket = data["ticket"]
+            _LOGGER.debug("Reusing stored ticket for %s", self.username)
+
+    async def async_save(self):
+        """Store the ticket and list ids."""
+        await self._store.async_save(
+            {
+                "ticket": self.ticket,
+                "issued": self.issued,
+                "lifetime": self.lifetime,
+                "lists": self.lists,
+            }
+        )
+
+    def ticket_expired(self):
+        """Return if the ticket is older than the lifetime observed so far."""
+        if self.issued is None or self.lifetime is None:
+            return False
+        return time.time() >= self.issued + self.lifetime
+
+    def ticket_rejected(self, ticket):
+        """Record how long the ticket lasted before ICA rejected it."""
+        if ticket != self.ticket or self.issued is None:
+            return
+        lifetime = time.time() - self.issued
+        if lifetime >= MIN_TICKET_LIFETIME:
+            self.lifetime = lifetime
+            _LOGGER.debug("Observed ticket lifetime %d seconds", lifetime)
+
+    async def async_renew_ticket(self, stale_ticket):
+        """Renew the ticket unless another caller already replaced stale_ticket.
+
+        Only one login runs at a time; concurrent callers wait for it and
+        then use the ticket it acquired.
+        """
+        async with self._lock:
+            if self.ticket is not None and self.ticket != stale_ticket:
+                return self.ticket
+
+            self.stats.increment("logins")
+            ticket = await self.authenticate()
+            if ticket is None:
+                self.stats.increment("login_errors")
+                _LOGGER.error("Failed to authenticate with ICA")
+                return None
+
+            self.ticket = ticket
+            self.issued = time.time()
+            await self.async_save()
+            return self.ticket
+
+    async def authenticate(self):
+        """Log in and return a new ticket."""
+        url = self.api_url + "/api/login"
+        async with self.session.get(url, auth=aiohttp.BasicAuth(self.username, self._password)) as response:
+            if response.status != 200:
+                _LOGGER.error("Login returned error %d", response.status)
+                return None
+            _LOGGER.debug("API request returned OK %d", response.status)
+            return response.headers["AuthenticationTicket"]
+
+
+class Connect:
+    """Client for one shopping list of an ICA account."""
+
+    def __init__(self, account, list_name, store_sorting=0):
+        """Initialize the client."""
+        self.account = account
+        self.listName = list_name
+        self.storeSorting = store_sorting
+        self.listId = None
+        self._list_lock = asyncio.Lock()
+
+    async def get_request(self, uri):
+        """Do asynchronous API request."""
+        return await self._async_request("get", uri, "")
+
+    async def post_request(self, uri, data, ext):
+        """Do asynchronous API request."""
+        return await self._async_request("post", uri, ext, data) #ext contains "/sync"
+
+    async def _async_request(self, method, uri, ext, data=None):
+        """Do an API request unless the circuit breaker is open."""
+        account = self.account
+        breaker = account.breaker
+        if not breaker.allow_request():
+            _LOGGER.debug("ICA cannot be reached, not sending request")
+            account.stats.increment("rejected")
+            return None
+        try:
+            result = await self._async_authorized_request(method, uri, ext, data)
+        except (aiohttp.ClientError, asyncio.TimeoutError, IcaServerError, IcaListError, ValueError) as err:
+            breaker.record_failure()
+            account.stats.increment("errors")
+            _LOGGER.error("API request failed: %s", err or type(err).__name__)
+            return None
+        except IcaRejectedError:
+            breaker.record_success()
+            raise
+        except BaseException:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+
+    async def _async_authorized_request(self, method, uri, ext, data):
+        """Do an API request, renewing the ticket and retrying once on 401.
+
+        A 401 to looking up the list id is handled the same way.
+
+        On 404 the list id is looked up again and the request retried once,
+        since the list may have been removed and created again in the app.
+        Raises IcaRejectedError if ICA refuses the content of the request and
+        returns None for other errors.
+        """
+        account = self.account
+        stats = account.stats
+        ticket = account.ticket
+        renew = ticket is None
+        renewed = False
+        looked_up = False
+        while True:
+            if renew or account.ticket_expired():
+                ticket = await account.async_renew_ticket(ticket)
+                if ticket is None:
+                    return None
+                renew = False
+            try:
+                list_id = self.listId
+                if list_id is None:
+                    list_id = await self.async_find_list(ticket)
+                    if list_id is None:
+                        return None
+
+                url = account.api_url + uri + "/" + list_id + ext
+                headers = {"Content-Type": "application/json", "AuthenticationTicket": ticket}
+                _LOGGER.debug("URL %s", url)
+
+                if data is not None:
+                    stats.observe("payload_bytes", len(data), SIZE_BUCKETS)
+                status, json_data = await self._async_send(method, url, headers, data, method.upper() + " " + uri + ext)
+            except IcaUnauthorizedError:
+                status = 401
+            if status == 401:
+                if renewed:
+                    break
+                _LOGGER.debug("API key expired. Acquire new")
+                stats.increment("unauthorized")
+                account.ticket_rejected(ticket)
+                renew = renewed = True
+                continue
+            if status == 404 and not looked_up:
+                _LOGGER.warning("Shopping list %s was not found, looking it up again", self.listName)
+                await self._async_forget_list(list_id)
+                looked_up = True
+                continue
+            if status != 200:
+                _LOGGER.error("API request returned error %d", status)
+                stats.increment("errors")
+                if status in REJECTED_STATUSES:
+                    raise IcaRejectedError(f"ICA returned {status}")
+                return None
+
+            _LOGGER.debug("API request returned OK %d", status)
+            _LOGGER.debug(json_data)
+            return json_data
+
+        _LOGGER.error("API request was not authorized after renewing the ticket")
+        return None
+
+    async def _async_send(self, method, url, headers, data, endpoint):
+        """Send a request and return the status and JSON body.
+
+        Server errors, 408 and 429 are retried, and so are network errors and
+        timeouts of GET requests, with exponential backoff and full jitter.
+        """
+        account = self.account
+        stats = account.stats
+        error = None
+        for attempt in range(account.retries + 1):
+            if attempt:
+                stats.increment("retries")
+                await asyncio.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** (attempt - 1)))
+            stats.increment("requests")
+            start = stats.start()
+            try:
+                async with account.session.request(method, url, data=data, headers=headers) as response:
+                    if response.status >= 500 or response.status in RETRY_STATUSES:
+                        error = IcaServerError(f"ICA returned {response.status}")
+                        continue
+                    if response.status != 200:
+                        return response.status, None
+                    body = await response.read()  # Await response content
+                    return response.status, loads(body) if body else None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                if method != "get":
+                    raise
+                error = err
+            finally:
+                stats.stop(endpoint, start)
+        raise error
+
+    async def async_find_list(self, ticket):
+        """Look up the id of the list, creating the list if ICA has none with its title.
+
+        Raises IcaUnauthorizedError if ICA does not accept the ticket and
+        IcaListError if it answers with another error, so a failed lookup
+        never creates the list a second time.
+        """
+        async with self._list_lock:
+            if self.listId is None:
+                self.listId = self.account.lists.get(self.listName)
+            if self.listId is not None:
+                return self.listId
+
+            headers = {"Content-Type": "application/json", "AuthenticationTicket": ticket}
+
+            listId = await self._async_lookup_list(headers)
+            if listId is None:
+                _LOGGER.info("Shopping-list not found: %s", self.listName)
+                newOfflineId = secrets.token_hex(4) + "-" + secrets.token_hex(2) + "-" + secrets.token_hex(2) + "-"
+                newOfflineId = newOfflineId + secrets.token_hex(2) + "-" + secrets.token_hex(6)
+                _LOGGER.debug("New hex-string: %s", newOfflineId)
+
+                data = dumps({"OfflineId": newOfflineId, "Title": self.listName, "SortingStore": self.storeSorting})
+
+                _LOGGER.debug("List does not exist. Creating %s", self.listName)
+                await self._async_lists_request("post", headers, data)
+                listId = await self._async_lookup_list(headers)
+                _LOGGER.debug(self.listName + " created with offlineId %s", listId)
+
+            if listId is None:
+                _LOGGER.error("Failed to find or create shopping list %s", self.listName)
+                return None
+
+            _LOGGER.debug("New listId: %s", listId)
+            self.listId = listId
+            self.account.lists[self.listName] = listId
+            await self.account.async_save()
+            return listId
+
+    async def _async_forget_list(self, list_id):
+        """Forget a list id ICA does not know, unless it was already replaced."""
+        async with self._list_lock:
+            if self.listId != list_id:
+                return
+            self.listId = None
+            if self.account.lists.get(self.listName) == list_id:
+                del self.account.lists[self.listName]
+                await self.account.async_save()
+
+    async def _async_lookup_list(self, headers):
+        """Return the id of the list with our title, or None if ICA has none."""
+        response = await self._async_lists_request("get", headers)
+        for lists in response["ShoppingLists"]:
+            if lists["Title"] == self.listName:
+                return lists["OfflineId"]
+        return None
+
+    async def _async_lists_request(self, method, headers, data=None):
+        """Send a request for the lists of the account and return the JSON body.
+
+        Raises IcaUnauthorizedError on 401 and IcaListError on other errors.
+        """
+        status, json_data = await self._async_send(
+            method, self.account.api_url + LISTS_URI, headers, data, method.upper() + " " + LISTS_URI
+        )
+        if status == 401:
+            raise IcaUnauthorizedError
+        if status != 200:
+            raise IcaListError(f"ICA returned {status} for the shopping lists")
+        return json_data
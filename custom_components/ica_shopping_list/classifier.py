@@ -0,0 +1,71 @@
+"""Article group classification of product names."""
+from functools import lru_cache
+import json
+import logging
+import os
+
+from .store import normalize_name
+
+_LOGGER = logging.getLogger(__name__)
+
+BUNDLED_ARTICLE_GROUPS = os.path.join(os.path.dirname(__file__), "article_groups.json")
+DEFAULT_ARTICLE_GROUP = 12
+CACHE_SIZE = 1024
+MIN_PREFIX = 3
+
+
+def load_article_groups(path):
+    """Load a {group: [names]} mapping file as {name: group}."""
+    with open(path, encoding="utf-8") as fil:
+        groups = json.load(fil)
+    return {name: int(group) for group, names in groups.items() for name in names}
+
+
+class ArticleGroupClassifier:
+    """Map product names to ICA article groups.
+
+    Names are looked up normalized, first as a whole, then token by token,
+    then by the longest known name that prefixes a token, so "Kaffebönor"
+    finds "Kaffe". Overrides replace entries of the mapping.
+    """
+
+    def __init__(self, names, overrides=None, default=DEFAULT_ARTICLE_GROUP):
+        """Initialize the classifier."""
+        self._names = {normalize_name(name): group for name, group in names.items()}
+        self._names.update(
+            (normalize_name(name), group) for name, group in (overrides or {}).items()
+        )
+        self._default = default
+        self.classify = lru_cache(maxsize=CACHE_SIZE)(self._classify)
+
+    @classmethod
+    def from_files(cls, user_path=None, overrides=None):
+        """Create a classifier from the bundled file and an optional user file."""
+        names = load_article_groups(BUNDLED_ARTICLE_GROUPS)
+        if user_path is not None:
+            try:
+                names.update(load_article_groups(user_path))
+            except (OSError, ValueError) as err:
+                _LOGGER.error("Failed to load article groups from %s: %s", user_path, err)
+        return cls(names, overrides)
+
+    def _classify(self, name):
+        """Return the article group of a product name."""
+        key = normalize_name(name)
+        group = self._names.get(key)
+        if group is not None:
+            return group
+
+        tokens = key.split()
+        for token in tokens:
+            group = self._names.get(token)
+            if group is not None:
+                return group
+
+        for token in tokens:
+            for end in range(len(token) - 1, MIN_PREFIX - 1, -1):
+                group = self._names.get(token[:end])
+                if group is not None:
+                    return group
+
+        return self._default
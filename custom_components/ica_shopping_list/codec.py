@@ -0,0 +1,23 @@
+"""JSON encoding of API payloads and journal entries.
+
+orjson is used when it is installed, which it is with Home Assistant,
+and the standard library otherwise. Both encode to compact UTF-8 bytes.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    dumps = orjson.dumps
+    loads = orjson.loads
+else:
+
+    def dumps(obj):
+        """Return obj encoded as JSON bytes."""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+    loads = json.loads
+
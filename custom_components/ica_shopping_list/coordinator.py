@@ -0,0 +1,124 @@
+"""Background polling of ICA shopping lists."""
+import logging
+import random
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+_LOGGER = logging.getLogger(__name__)
+
+BACKOFF_FACTOR = 2
+JITTER = 0.1
+
+
+class ListPoller:
+    """Poll a shopping list, quickly after activity and slower while idle.
+
+    The interval starts at min_interval, doubles after every poll that finds
+    no changes up to max_interval, and drops back to min_interval when a poll
+    finds changes or the list is changed locally. Every delay is randomized
+    by JITTER so several lists and instances do not poll in step.
+    """
+
+    def __init__(self, hass, data, min_interval, max_interval):
+        """Initialize the poller."""
+        self.hass = hass
+        self.data = data
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.polls = 0
+        self.unchanged = 0
+        self.failures = 0
+        self.last_latency = None
+        self._total_latency = 0.0
+        self._unsub = None
+        self._polling = False
+        self._stopped = True
+
+    @property
+    def stats(self):
+        """Return polling statistics."""
+        return {
+            "polls": self.polls,
+            "unchanged": self.unchanged,
+            "failures": self.failures,
+            "interval": self.interval,
+            "last_latency": self.last_latency,
+            "average_latency": self._total_latency / self.polls if self.polls else None,
+        }
+
+    @callback
+    def async_start(self):
+        """Start polling."""
+        self._stopped = False
+        self._async_schedule()
+
+    @callback
+    def async_stop(self):
+        """Stop polling."""
+        self._stopped = True
+        self._async_cancel()
+
+    @callback
+    def async_activity(self):
+        """Poll quickly again because the list was just changed."""
+        if self.interval == self.min_interval:
+            return
+        self.interval = self.min_interval
+        if self._unsub is not None:
+            self._async_cancel()
+            self._async_schedule()
+
+    @callback
+    def _async_cancel(self):
+        """Cancel the scheduled poll."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _async_schedule(self):
+        """Schedule the next poll."""
+        if self._stopped or self._polling:
+            return
+        delay = self.interval * random.uniform(1 - JITTER, 1 + JITTER)
+        self._unsub = async_call_later(self.hass, delay, self._async_poll)
+
+    async def _async_poll(self, _now):
+        """Fetch the list, adapt the interval and schedule the next poll."""
+        self._unsub = None
+        self._polling = True
+        start = time.monotonic()
+        changed = None
+        try:
+            changed = await self.data.async_reconcile()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Failed to poll %s", self.data.name)
+        finally:
+            self._polling = False
+            self._async_record(changed, time.monotonic() - start)
+            self._async_schedule()
+
+    @callback
+    def _async_record(self, changed, latency):
+        """Record a poll and adapt the interval to its outcome."""
+        self.polls += 1
+        self.last_latency = latency
+        self._total_latency += latency
+
+        if changed is None:
+            self.failures += 1
+            self.interval = min(self.interval * BACKOFF_FACTOR, self.max_interval)
+        elif changed:
+            self.interval = self.min_interval
+        else:
+            self.unchanged += 1
+            self.interval = min(self.interval * BACKOFF_FACTOR, self.max_interval)
+        _LOGGER.debug(
+            "Polled %s in %.3f seconds, next poll in about %d seconds",
+            self.data.name,
+            latency,
+            self.interval,
+        )
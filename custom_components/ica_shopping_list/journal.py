@@ -0,0 +1,188 @@
+"""Journal of shopping list mutations that ICA has not accepted yet."""
+import logging
+import os
+import tempfile
+
+from .codec import dumps, loads
+from .store import ShoppingItem
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SyncBatch:
+    """Mutations merged into the body of a single sync request.
+
+    Rows are keyed by OfflineId, so a change to a created row is folded into
+    it, and deleting a created row drops both.
+    """
+
+    def __init__(self):
+        """Initialize an empty batch."""
+        self.created = {}
+        self.changed = {}
+        self.deleted = {}
+
+    def __bool__(self):
+        """Return if the batch holds any mutation."""
+        return bool(self.created or self.changed or self.deleted)
+
+    def __len__(self):
+        """Return the number of rows in the batch."""
+        return len(self.created) + len(self.changed) + len(self.deleted)
+
+    @classmethod
+    def from_payload(cls, payload):
+        """Create a batch from a sync request body."""
+        batch = cls()
+        batch.add_payload(payload)
+        return batch
+
+    def add(self, created=(), changed=(), deleted=()):
+        """Merge rows into the batch."""
+        for row in created:
+            self.created[row["OfflineId"]] = dict(row)
+        for row in changed:
+            item_id = row["OfflineId"]
+            if item_id in self.deleted:
+                continue
+            if item_id in self.created:
+                self.created[item_id].update(row)
+            else:
+                self.changed.setdefault(item_id, {}).update(row)
+        for item_id in deleted:
+            self.changed.pop(item_id, None)
+            if self.created.pop(item_id, None) is None:
+                self.deleted[item_id] = None
+
+    def add_payload(self, payload):
+        """Merge a sync request body into the batch."""
+        self.add(
+            payload.get("CreatedRows", ()),
+            payload.get("ChangedRows", ()),
+            payload.get("DeletedRows", ()),
+        )
+
+    def merge(self, other):
+        """Merge a later batch into this one."""
+        self.add_payload(other.payload())
+
+    def apply(self, items):
+        """Return the items as they are once ICA has accepted the batch."""
+        if not self:
+            return items
+        result = {item.id: item for item in items}
+        for item_id in self.deleted:
+            result.pop(item_id, None)
+        for item_id, row in self.changed.items():
+            item = result.get(item_id)
+            if item is not None:
+                result[item_id] = item.updated(row)
+        for item_id, row in self.created.items():
+            result[item_id] = ShoppingItem.from_row(row)
+        return list(result.values())
+
+    def split(self):
+        """Return a batch per row."""
+        batches = []
+        for row in self.created.values():
+            batches.append(SyncBatch())
+            batches[-1].add(created=[row])
+        for row in self.changed.values():
+            batches.append(SyncBatch())
+            batches[-1].add(changed=[row])
+        for item_id in self.deleted:
+            batches.append(SyncBatch())
+            batches[-1].add(deleted=[item_id])
+        return batches
+
+    def payload(self):
+        """Return the sync request body."""
+        payload = {}
+        if self.created:
+            payload["CreatedRows"] = list(self.created.values())
+        if self.changed:
+            payload["ChangedRows"] = list(self.changed.values())
+        if self.deleted:
+            payload["DeletedRows"] = list(self.deleted)
+        return payload
+
+
+def _check_payload(payload):
+    """Raise ValueError unless payload has the shape of a sync request body."""
+    if not isinstance(payload, dict):
+        raise ValueError("entry is not an object")
+    for key in ("CreatedRows", "ChangedRows", "DeletedRows"):
+        if not isinstance(payload.get(key, []), list):
+            raise ValueError(f"{key} is not a list")
+    for key in ("CreatedRows", "ChangedRows"):
+        for row in payload.get(key, ()):
+            if not isinstance(row, dict) or not isinstance(row.get("OfflineId"), str):
+                raise ValueError(f"{key} has a row without OfflineId")
+            if not isinstance(row.get("ProductName", ""), str):
+                raise ValueError(f"{key} has a row with an invalid ProductName")
+    for row in payload.get("CreatedRows", ()):
+        if "ProductName" not in row:
+            raise ValueError("CreatedRows has a row without ProductName")
+    if not all(isinstance(item_id, str) for item_id in payload.get("DeletedRows", ())):
+        raise ValueError("DeletedRows has an invalid id")
+
+
+class MutationJournal:
+    """Append-only file of sync request bodies not yet accepted by ICA.
+
+    Every batch is appended before it is sent. When a sync fails the file is
+    rewritten as one compacted batch, and it is removed once ICA has
+    accepted everything in it.
+    """
+
+    def __init__(self, path):
+        """Initialize the journal."""
+        self.path = path
+
+    def load(self):
+        """Return the pending mutations as one batch."""
+        batch = SyncBatch()
+        try:
+            with open(self.path, "rb") as fil:
+                for line in fil:
+                    try:
+                        payload = loads(line)
+                        _check_payload(payload)
+                    except ValueError as err:
+                        _LOGGER.warning("Skipping damaged entry in %s: %s", self.path, err)
+                        continue
+                    batch.add_payload(payload)
+        except FileNotFoundError:
+            pass
+        return batch
+
+    def append(self, payload):
+        """Durably add a sync request body."""
+        with open(self.path, "ab") as fil:
+            fil.write(dumps(payload) + b"\n")
+            fil.flush()
+            os.fsync(fil.fileno())
+
+    def rewrite(self, payload):
+        """Replace the journal with a single sync request body."""
+        if not payload:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        # A temporary file of our own, so rewrites never replace each other's
+        directory, name = os.path.split(self.path)
+        fd, tmp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory or None)
+        try:
+            with os.fdopen(fd, "wb") as fil:
+                fil.write(dumps(payload) + b"\n")
+                fil.flush()
+                os.fsync(fil.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,128 @@
+"""Fuzzy lookup of shopping list items by name."""
+from functools import lru_cache
+import unicodedata
+
+DEFAULT_MATCH_THRESHOLD = 0.75
+MATCH_MARGIN = 0.1
+CACHE_SIZE = 4096
+MIN_STEM = 3
+# Swedish plural endings, and the singular endings they replace, as in
+# gurka/gurkor, bulle/bullar, lök/lökar and tomat/tomater
+PLURAL_SUFFIXES = ("or", "ar", "er")
+SINGULAR_SUFFIXES = ("a", "e")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def fold_name(name):
+    """Return the key used for fuzzy lookups.
+
+    Diacritics are removed, so "Mjölk" and "mjolk" fold alike, whitespace
+    is collapsed and plural and singular endings are stripped from every
+    word, so "Gurka" and "gurkor" fold alike.
+    """
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(_stem(word) for word in stripped.split())
+
+
+def _stem(word):
+    """Return the word without a plural or singular ending."""
+    for suffix in PLURAL_SUFFIXES + SINGULAR_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[: -len(suffix)]
+    return word
+
+
+def trigrams(key):
+    """Return the set of trigrams of a folded key."""
+    padded = f"  {key} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class MatchIndex:
+    """Trigram index of item names.
+
+    Items are added and removed one at a time as the list changes. Searches
+    rank items by the Dice coefficient of their trigrams with the query and
+    only score items that share at least one trigram with it. Items are
+    also indexed by their folded name for lookups that must not guess.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self._grams = {}
+        self._seq = {}
+        self._keys = {}
+        self._by_key = {}
+        self._postings = {}
+        self._next_seq = 0
+
+    def add(self, item_id, name):
+        """Index the name of an item, replacing its previous name."""
+        seq = self._seq.get(item_id)
+        if seq is None:
+            seq = self._next_seq
+            self._next_seq += 1
+        else:
+            self.remove(item_id)
+        key = fold_name(name)
+        grams = trigrams(key)
+        self._grams[item_id] = grams
+        self._seq[item_id] = seq
+        self._keys[item_id] = key
+        self._by_key.setdefault(key, {})[item_id] = None
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(item_id)
+
+    def remove(self, item_id):
+        """Remove an item from the index."""
+        grams = self._grams.pop(item_id)
+        del self._seq[item_id]
+        key = self._keys.pop(item_id)
+        ids = self._by_key[key]
+        del ids[item_id]
+        if not ids:
+            del self._by_key[key]
+        for gram in grams:
+            ids = self._postings[gram]
+            ids.discard(item_id)
+            if not ids:
+                del self._postings[gram]
+
+    def clear(self):
+        """Remove every item."""
+        self._grams = {}
+        self._seq = {}
+        self._keys = {}
+        self._by_key = {}
+        self._postings = {}
+
+    def key(self, item_id):
+        """Return the folded name of an item."""
+        return self._keys[item_id]
+
+    def exact(self, name):
+        """Return the ids of items whose folded name equals that of name, oldest first."""
+        ids = self._by_key.get(fold_name(name), ())
+        seq = self._seq
+        return sorted(ids, key=seq.__getitem__)
+
+    def search(self, name, threshold=DEFAULT_MATCH_THRESHOLD):
+        """Return (score, item id) of items scoring at least threshold, best first.
+
+        Items with the same score are returned oldest first.
+        """
+        query = trigrams(fold_name(name))
+        shared = {}
+        for gram in query:
+            for item_id in self._postings.get(gram, ()):
+                shared[item_id] = shared.get(item_id, 0) + 1
+        size = len(query)
+        results = []
+        for item_id, count in shared.items():
+            score = 2 * count / (size + len(self._grams[item_id]))
+            if score >= threshold:
+                results.append((score, item_id))
+        seq = self._seq
+        results.sort(key=lambda result: (-result[0], seq[result[1]]))
+        return results
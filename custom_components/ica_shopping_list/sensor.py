@@ -0,0 +1,105 @@
+"""Diagnostic sensors for the ICA shopping lists."""
+from datetime import timedelta
+
+from homeassistant.components.sensor import SensorEntity
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.util import slugify
+
+from . import DATA_BREAKER, DATA_STATS, DOMAIN
+
+SCAN_INTERVAL = timedelta(seconds=60)
+
+COUNTERS = ("requests", "errors", "unauthorized", "retries", "logins", "rejected")
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the diagnostic sensors."""
+    if discovery_info is None:
+        return
+    stats = hass.data[DATA_STATS]
+    entities = [IcaCounterSensor(stats, counter) for counter in COUNTERS]
+    entities.append(IcaBreakerSensor(hass.data[DATA_BREAKER]))
+    for data in hass.data[DOMAIN].values():
+        entities.append(IcaItemCountSensor(data))
+        entities.append(IcaPollLatencySensor(data))
+    async_add_entities(entities)
+
+
+class IcaDiagnosticSensor(SensorEntity):
+    """Base class of the diagnostic sensors."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+
+class IcaCounterSensor(IcaDiagnosticSensor):
+    """Number of ICA API events of one kind."""
+
+    def __init__(self, stats, counter):
+        """Initialize the sensor."""
+        self._stats = stats
+        self._counter = counter
+        self._attr_name = f"ICA {counter}"
+        self._attr_unique_id = f"{DOMAIN}_{counter}"
+
+    @property
+    def native_value(self):
+        """Return the count."""
+        return self._stats.counters.get(self._counter, 0)
+
+
+class IcaBreakerSensor(IcaDiagnosticSensor):
+    """State of the circuit breaker in front of the ICA API."""
+
+    _attr_name = "ICA connection"
+    _attr_unique_id = f"{DOMAIN}_breaker"
+
+    def __init__(self, breaker):
+        """Initialize the sensor."""
+        self._breaker = breaker
+
+    @property
+    def native_value(self):
+        """Return closed, open or half_open."""
+        return self._breaker.state
+
+    @property
+    def extra_state_attributes(self):
+        """Return the consecutive failures."""
+        return {"failures": self._breaker.failures}
+
+
+class IcaItemCountSensor(IcaDiagnosticSensor):
+    """Number of items on a shopping list."""
+
+    def __init__(self, data):
+        """Initialize the sensor."""
+        self._data = data
+        self._attr_name = f"ICA {data.name} items"
+        self._attr_unique_id = f"{DOMAIN}_{slugify(data.name)}_items"
+
+    @property
+    def native_value(self):
+        """Return the number of items."""
+        return len(self._data.items)
+
+
+class IcaPollLatencySensor(IcaDiagnosticSensor):
+    """Latency of the last poll of a shopping list."""
+
+    _attr_native_unit_of_measurement = "s"
+
+    def __init__(self, data):
+        """Initialize the sensor."""
+        self._data = data
+        self._attr_name = f"ICA {data.name} poll latency"
+        self._attr_unique_id = f"{DOMAIN}_{slugify(data.name)}_poll_latency"
+
+    @property
+    def native_value(self):
+        """Return the latency of the last poll."""
+        return self._data.poller.last_latency
+
+    @property
+    def extra_state_attributes(self):
+        """Return the polling statistics."""
+        return self._data.poller.stats
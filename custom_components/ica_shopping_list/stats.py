@@ -0,0 +1,100 @@
+"""Latency histograms and counters for the ICA integration."""
+import bisect
+import functools
+import time
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (1, 10, 100, 1000, 10000)
+
+
+class Histogram:
+    """Counts of observed values per bucket."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Initialize the histogram."""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value):
+        """Add a value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self):
+        """Return the histogram as a dict."""
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else None,
+            "buckets": dict(zip([*map(str, self.buckets), "inf"], self.counts)),
+        }
+
+
+class Instrumentation:
+    """Histograms and counters, recorded only while enabled.
+
+    Timing uses start() and stop() so a disabled instance costs a
+    single attribute check per call.
+    """
+
+    def __init__(self, enabled=False):
+        """Initialize the instrumentation."""
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+
+    def start(self):
+        """Return a start time for stop(), or None while disabled."""
+        return time.monotonic() if self.enabled else None
+
+    def stop(self, name, start):
+        """Record the time since start."""
+        if start is not None:
+            self.observe(name, time.monotonic() - start)
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        """Add a value to a histogram."""
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+    def increment(self, name, value=1):
+        """Increase a counter."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        """Return all histograms and counters."""
+        return {
+            "enabled": self.enabled,
+            "counters": dict(self.counters),
+            "histograms": {name: hist.as_dict() for name, hist in self.histograms.items()},
+        }
+
+
+def timed(operation):
+    """Record the latency of a coroutine method of an object with a stats attribute."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            start = self.stats.start()
+            try:
+                return await func(self, *args, **kwargs)
+            finally:
+                self.stats.stop(operation, start)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,369 @@
+"""Indexed storage of shopping list items."""
+import bisect
+from functools import lru_cache
+import unicodedata
+
+from .codec import dumps
+from .matcher import DEFAULT_MATCH_THRESHOLD, MATCH_MARGIN, MatchIndex
+
+_capitalize = lru_cache(maxsize=4096)(str.capitalize)
+
+
+def normalize_name(name):
+    """Return the key used to look up an item by name."""
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+class ShoppingItem:
+    """A shopping list item.
+
+    Items are not changed after they are created; a changed row from ICA
+    becomes a new item.
+    """
+
+    __slots__ = ("id", "name", "complete", "source_id", "article_group")
+
+    def __init__(self, item_id, name, complete, source_id, article_group=None):
+        """Initialize the item."""
+        self.id = item_id
+        self.name = name
+        self.complete = complete
+        self.source_id = source_id
+        self.article_group = article_group
+
+    def __eq__(self, other):
+        """Return if two items have the same content."""
+        if not isinstance(other, ShoppingItem):
+            return NotImplemented
+        return (
+            self.id == other.id
+            and self.name == other.name
+            and self.complete == other.complete
+            and self.source_id == other.source_id
+            and self.article_group == other.article_group
+        )
+
+    def __repr__(self):
+        """Return the representation of the item."""
+        return f"<ShoppingItem {self.id} {self.name!r} complete={self.complete}>"
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create an item from its JSON representation."""
+        return cls(
+            data["id"],
+            data["name"],
+            data["complete"],
+            data["SourceId"],
+            data.get("ArticleGroupId"),
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        """Create an item from a CreatedRows entry of a sync request."""
+        return cls(
+            row["OfflineId"],
+            _capitalize(row["ProductName"]),
+            _striked_over(row.get("IsStrikedOver", False)),
+            row.get("SourceId", -1),
+            row.get("ArticleGroupId"),
+        )
+
+    def updated(self, row):
+        """Return a copy of the item with a ChangedRows entry applied."""
+        return ShoppingItem(
+            self.id,
+            _capitalize(row["ProductName"]) if "ProductName" in row else self.name,
+            _striked_over(row["IsStrikedOver"]) if "IsStrikedOver" in row else self.complete,
+            self.source_id,
+            self.article_group,
+        )
+
+    def as_dict(self):
+        """Return the JSON representation of the item."""
+        return {
+            "name": self.name,
+            "id": self.id,
+            "complete": self.complete,
+            "SourceId": self.source_id,
+            "ArticleGroupId": self.article_group,
+        }
+
+
+def _striked_over(value):
+    """Return IsStrikedOver of a sync row, which may be sent as a string, as a bool."""
+    return value is True or value == "true"
+
+
+def parse_rows(rows):
+    """Return the items of the Rows of an API response."""
+    item = ShoppingItem
+    capitalize = _capitalize
+    return [
+        item(
+            row["OfflineId"],
+            capitalize(row["ProductName"]),
+            row["IsStrikedOver"],
+            row["SourceId"],
+            row.get("ArticleGroupId"),
+        )
+        for row in rows
+    ]
+
+
+class AisleIndex:
+    """Item ids in the order they are found walking through a store.
+
+    Items are ordered by article group, groups listed in aisle_order first
+    and in that order and the other groups by number, and completed items
+    last. Items of the same group keep the order they were added in. The
+    order is kept up to date as items change, so reading it never sorts.
+    """
+
+    def __init__(self, aisle_order=()):
+        """Initialize an empty index."""
+        self._rank = {group: rank for rank, group in enumerate(aisle_order)}
+        self._keys = {}
+        self._sorted = []
+        self._next_seq = 0
+
+    def _key(self, item, seq):
+        """Return the sort key of an item."""
+        rank = self._rank.get(item.article_group)
+        group = (0, rank) if rank is not None else (1, item.article_group or 0)
+        return (bool(item.complete), group, seq, item.id)
+
+    def add(self, item):
+        """Index an item, moving it if it was indexed before."""
+        old = self._keys.get(item.id)
+        if old is None:
+            seq = self._next_seq
+            self._next_seq += 1
+        else:
+            seq = old[2]
+        key = self._key(item, seq)
+        if key == old:
+            return
+        if old is not None:
+            self._remove_key(old)
+        self._keys[item.id] = key
+        bisect.insort(self._sorted, key)
+
+    def remove(self, item_id):
+        """Remove an item from the index."""
+        self._remove_key(self._keys.pop(item_id))
+
+    def clear(self):
+        """Remove every item."""
+        self._keys = {}
+        self._sorted = []
+
+    def ids(self):
+        """Return the item ids in aisle order."""
+        return [key[3] for key in self._sorted]
+
+    def _remove_key(self, key):
+        """Remove a key from the sorted keys."""
+        del self._sorted[bisect.bisect_left(self._sorted, key)]
+
+
+class ItemStore:
+    """Shopping list items indexed by id and by normalized name.
+
+    Items keep the order they were added in. When several items share a
+    name, name lookups return the oldest item that is not completed, or the
+    oldest item if all of them are completed.
+
+    items and as_dicts return immutable snapshots that are replaced, never
+    changed, so readers can keep them while the store changes.
+    """
+
+    def __init__(self, items=(), aisle_order=()):
+        """Initialize the store."""
+        self._by_id = {}
+        self._by_name = {}
+        self._index = MatchIndex()
+        self._aisles = AisleIndex(aisle_order)
+        self._items = None
+        self._dicts = None
+        self._json = None
+        self._sorted_items = None
+        self._sorted_dicts = None
+        self._sorted_json = None
+        self.version = 0
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        """Return the number of items."""
+        return len(self._by_id)
+
+    def __contains__(self, item_id):
+        """Return if an item with the id exists."""
+        return item_id in self._by_id
+
+    @property
+    def items(self):
+        """Return the items in insertion order as a tuple."""
+        if self._items is None:
+            self._items = tuple(self._by_id.values())
+        return self._items
+
+    @property
+    def sorted_items(self):
+        """Return the items in aisle order as a tuple."""
+        if self._sorted_items is None:
+            by_id = self._by_id
+            self._sorted_items = tuple(by_id[item_id] for item_id in self._aisles.ids())
+        return self._sorted_items
+
+    def as_dicts(self, store_sorted=False):
+        """Return the JSON representation of the items as a tuple."""
+        if store_sorted:
+            if self._sorted_dicts is None:
+                self._sorted_dicts = tuple(item.as_dict() for item in self.sorted_items)
+            return self._sorted_dicts
+        if self._dicts is None:
+            self._dicts = tuple(item.as_dict() for item in self.items)
+        return self._dicts
+
+    def as_json(self, store_sorted=False):
+        """Return the JSON representation of the items as bytes."""
+        if store_sorted:
+            if self._sorted_json is None:
+                self._sorted_json = dumps(self.as_dicts(True))
+            return self._sorted_json
+        if self._json is None:
+            self._json = dumps(self.as_dicts())
+        return self._json
+
+    def get(self, item_id):
+        """Return the item with the id, or None."""
+        return self._by_id.get(item_id)
+
+    def find(self, name, exclude=()):
+        """Return the item matching the name, or None.
+
+        Items with ids in exclude are skipped.
+        """
+        return self._pick(self._by_name.get(normalize_name(name), ()), exclude)
+
+    def find_folded(self, name, exclude=()):
+        """Return the item matching the name, or ignoring diacritics and plurals, or None.
+
+        Never guesses, so it is safe for removing items.
+        """
+        item = self.find(name, exclude)
+        if item is not None:
+            return item
+        return self._pick(self._index.exact(name), exclude)
+
+    def match(self, name, threshold=DEFAULT_MATCH_THRESHOLD, exclude=()):
+        """Return the item matching the name best, or None.
+
+        A match found by find_folded wins. Otherwise names are ranked by
+        trigram similarity, and the most similar name is returned only if it
+        scores at least threshold and MATCH_MARGIN more than any other name.
+        """
+        item = self.find_folded(name, exclude)
+        if item is not None:
+            return item
+        results = [
+            result
+            for result in self._index.search(name, threshold - MATCH_MARGIN)
+            if result[1] not in exclude
+        ]
+        if not results or results[0][0] < threshold:
+            return None
+        best_score, best_id = results[0]
+        key = self._index.key(best_id)
+        ids = []
+        for score, item_id in results:
+            if self._index.key(item_id) == key:
+                ids.append(item_id)
+            elif score > best_score - MATCH_MARGIN:
+                return None
+        return self._pick(ids, exclude)
+
+    def _pick(self, ids, exclude):
+        """Return the oldest incomplete item of ids, or the oldest item, skipping exclude."""
+        first = None
+        for item_id in ids:
+            if item_id in exclude:
+                continue
+            item = self._by_id[item_id]
+            if not item.complete:
+                return item
+            if first is None:
+                first = item
+        return first
+
+    def add(self, item):
+        """Add an item, or replace the item with the same id in place."""
+        old = self._by_id.get(item.id)
+        if old is not None:
+            self._unindex(old)
+        if old is None or old.name != item.name:
+            self._index.add(item.id, item.name)
+        self._aisles.add(item)
+        self._by_id[item.id] = item
+        self._by_name.setdefault(normalize_name(item.name), {})[item.id] = None
+        self._changed()
+
+    def remove(self, item_id):
+        """Remove the item with the id and return it."""
+        item = self._by_id.pop(item_id)
+        self._unindex(item)
+        self._index.remove(item_id)
+        self._aisles.remove(item_id)
+        self._changed()
+        return item
+
+    def replace(self, items):
+        """Replace all items."""
+        self._by_id = {}
+        self._by_name = {}
+        self._index.clear()
+        self._aisles.clear()
+        self._changed()
+        for item in items:
+            self.add(item)
+
+    def apply(self, items):
+        """Update the store to match items, touching only the differences.
+
+        Returns the lists of added, changed and removed items.
+        """
+        added = []
+        changed = []
+        seen = set()
+        for item in items:
+            seen.add(item.id)
+            old = self._by_id.get(item.id)
+            if old is None:
+                added.append(item)
+            elif old != item:
+                changed.append(item)
+            else:
+                continue
+            self.add(item)
+        removed = [self.remove(item_id) for item_id in list(self._by_id) if item_id not in seen]
+        return added, changed, removed
+
+    def _changed(self):
+        """Drop the cached views and bump the version."""
+        self._items = None
+        self._dicts = None
+        self._json = None
+        self._sorted_items = None
+        self._sorted_dicts = None
+        self._sorted_json = None
+        self.version += 1
+
+    def _unindex(self, item):
+        """Remove an item from the name index."""
+        key = normalize_name(item.name)
+        ids = self._by_name[key]
+        del ids[item.id]
+        if not ids:
+            del self._by_name[key]
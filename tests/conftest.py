@@ -0,0 +1,45 @@
+"""Fixtures for the ICA shopping list tests."""
+import pytest
+
+from homeassistant.setup import async_setup_component
+
+from custom_components.ica_shopping_list import DOMAIN
+
+from .fake_ica import FakeIca
+
+LIST_NAME = "Inköp"
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations, hass, tmp_path):
+    """Load the integration from custom_components and keep its files in tmp_path."""
+    hass.config.config_dir = str(tmp_path)
+
+
+@pytest.fixture
+async def fake_ica(socket_enabled):
+    """Return a running stand-in of the ICA API."""
+    server = FakeIca()
+    await server.start()
+    yield server
+    await server.close()
+
+
+@pytest.fixture
+def setup_integration(hass, fake_ica):
+    """Return a function setting up the integration against fake_ica."""
+
+    async def setup(**options):
+        assert await async_setup_component(hass, "http", {})
+        config = {
+            "username": fake_ica.username,
+            "password": fake_ica.password,
+            "listname": LIST_NAME,
+            "api_url": fake_ica.url,
+            **options,
+        }
+        assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+        await hass.async_block_till_done()
+        return hass.data[DOMAIN][LIST_NAME]
+
+    return setup
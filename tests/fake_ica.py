@@ -0,0 +1,181 @@
+"""Stand-in for the ICA shopping list API, served on localhost."""
+import asyncio
+import uuid
+
+from aiohttp import BasicAuth, web
+
+LISTS_URI = "/api/user/offlineshoppinglists"
+
+
+def make_rows(count, prefix="Item", complete_every=0):
+    """Return count shopping list rows as ICA returns them."""
+    return [
+        {
+            "OfflineId": str(uuid.uuid4()),
+            "ProductName": f"{prefix} {index}",
+            "IsStrikedOver": bool(complete_every) and index % complete_every == 0,
+            "SourceId": -1,
+            "ArticleGroupId": index % 12 + 1,
+        }
+        for index in range(count)
+    ]
+
+
+class FakeIca:
+    """ICA API serving the login, list and sync endpoints.
+
+    latency delays every response. fail() queues error statuses, or a
+    dropped connection for status None, that are answered instead of the
+    next requests. Created rows named in rejected_names make a sync answer
+    400 and are not stored.
+    """
+
+    def __init__(self, username="user", password="1234", latency=0):
+        """Initialize the server without any list."""
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.tickets = set()
+        self.lists = {}
+        self.logins = 0
+        self.requests = []
+        self.rejected_names = set()
+        self._failures = []
+        self._runner = None
+        self.url = None
+
+    def add_list(self, title, rows=(), list_id=None):
+        """Add a list and return its id."""
+        list_id = list_id or str(uuid.uuid4())
+        self.lists[list_id] = {"Title": title, "SortingStore": 0, "Rows": list(rows)}
+        return list_id
+
+    def rows(self, list_id):
+        """Return the rows of a list."""
+        return self.lists[list_id]["Rows"]
+
+    def fail(self, status, times=1, method=None, path=None):
+        """Answer the next times requests, of method and to path if given, with status."""
+        self._failures.extend([(status, method, path)] * times)
+
+    def expire_tickets(self):
+        """Reject every ticket handed out so far."""
+        self.tickets.clear()
+
+    def count(self, method, path_suffix=""):
+        """Return how many requests were made with method to a path ending in path_suffix."""
+        return sum(
+            1
+            for req_method, path in self.requests
+            if req_method == method and path.endswith(path_suffix)
+        )
+
+    async def start(self):
+        """Start serving on a free port."""
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/api/login", self._login)
+        app.router.add_get(LISTS_URI, self._get_lists)
+        app.router.add_post(LISTS_URI, self._create_list)
+        app.router.add_get(LISTS_URI + "/{list_id}", self._get_list)
+        app.router.add_post(LISTS_URI + "/{list_id}/sync", self._sync)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def close(self):
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        """Log the request, wait the latency and answer queued failures."""
+        self.requests.append((request.method, request.path))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for index, (status, method, path) in enumerate(self._failures):
+            if (method is None or method == request.method) and (
+                path is None or path == request.path
+            ):
+                del self._failures[index]
+                if status is None:
+                    request.transport.close()
+                    raise asyncio.CancelledError
+                return web.Response(status=status)
+        if request.path != "/api/login":
+            if request.headers.get("AuthenticationTicket") not in self.tickets:
+                return web.Response(status=401)
+        return await handler(request)
+
+    async def _login(self, request):
+        """Hand out a ticket for valid credentials."""
+        auth = request.headers.get("Authorization")
+        try:
+            credentials = BasicAuth.decode(auth)
+        except (TypeError, ValueError):
+            return web.Response(status=401)
+        if (credentials.login, credentials.password) != (self.username, self.password):
+            return web.Response(status=401)
+        self.logins += 1
+        ticket = uuid.uuid4().hex
+        self.tickets.add(ticket)
+        return web.Response(headers={"AuthenticationTicket": ticket})
+
+    async def _get_lists(self, request):
+        """Return the titles and ids of all lists."""
+        return web.json_response(
+            {
+                "ShoppingLists": [
+                    {"Title": lst["Title"], "OfflineId": list_id}
+                    for list_id, lst in self.lists.items()
+                ]
+            }
+        )
+
+    async def _create_list(self, request):
+        """Create a list."""
+        body = await request.json()
+        self.add_list(body["Title"], list_id=body["OfflineId"])
+        return web.Response()
+
+    async def _get_list(self, request):
+        """Return a list with its rows."""
+        lst = self.lists.get(request.match_info["list_id"])
+        if lst is None:
+            return web.Response(status=404)
+        return web.json_response({"Title": lst["Title"], "Rows": lst["Rows"]})
+
+    async def _sync(self, request):
+        """Apply created, changed and deleted rows and return the list."""
+        lst = self.lists.get(request.match_info["list_id"])
+        if lst is None:
+            return web.Response(status=404)
+        body = await request.json()
+        created = body.get("CreatedRows", [])
+        if any(row.get("ProductName") in self.rejected_names for row in created):
+            return web.Response(status=400)
+        rows = {row["OfflineId"]: row for row in lst["Rows"]}
+        for row in created:
+            rows[row["OfflineId"]] = {
+                "OfflineId": row["OfflineId"],
+                "ProductName": row["ProductName"],
+                "IsStrikedOver": row.get("IsStrikedOver") in (True, "true"),
+                "SourceId": row.get("SourceId", -1),
+                "ArticleGroupId": row.get("ArticleGroupId"),
+            }
+        for row in body.get("ChangedRows", []):
+            old = rows.get(row["OfflineId"])
+            if old is None:
+                continue
+            if "ProductName" in row:
+                old["ProductName"] = row["ProductName"]
+            if "IsStrikedOver" in row:
+                old["IsStrikedOver"] = row["IsStrikedOver"] in (True, "true")
+        for item_id in body.get("DeletedRows", []):
+            rows.pop(item_id, None)
+        lst["Rows"] = list(rows.values())
+        return web.json_response({"Title": lst["Title"], "Rows": lst["Rows"]})
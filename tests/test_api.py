@@ -0,0 +1,286 @@
+"""Tests of the ICA API client."""
+import asyncio
+
+import pytest
+
+from custom_components.ica_shopping_list import api
+from custom_components.ica_shopping_list.api import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    Connect,
+    IcaAccount,
+    IcaRejectedError,
+    async_create_session,
+)
+
+from .conftest import LIST_NAME
+from .fake_ica import make_rows
+
+URI = "/api/user/offlineshoppinglists"
+SYNC = b'{"DeletedRows":["unknown"]}'
+
+
+@pytest.fixture
+async def account(hass, fake_ica):
+    """Return an account of fake_ica on a pooled session."""
+    session = async_create_session(10, 5)
+    account = IcaAccount(hass, session, fake_ica.username, fake_ica.password, fake_ica.url)
+    yield account
+    await session.close()
+
+
+@pytest.fixture
+def client(fake_ica, account):
+    """Return a client of a list with a few items."""
+    fake_ica.add_list(LIST_NAME, make_rows(3))
+    return Connect(account, LIST_NAME)
+
+
+async def test_concurrent_requests_log_in_once(fake_ica, client):
+    """Concurrent requests without a ticket share a single login."""
+    fake_ica.latency = 0.05
+
+    results = await asyncio.gather(*(client.get_request(URI) for _ in range(20)))
+
+    assert all(len(result["Rows"]) == 3 for result in results)
+    assert fake_ica.logins == 1
+
+
+async def test_concurrent_requests_renew_rejected_ticket_once(fake_ica, client):
+    """Concurrent requests whose ticket is rejected share a single renewal."""
+    await client.get_request(URI)
+    fake_ica.expire_tickets()
+    fake_ica.latency = 0.05
+
+    results = await asyncio.gather(*(client.get_request(URI) for _ in range(20)))
+
+    assert all(len(result["Rows"]) == 3 for result in results)
+    assert fake_ica.logins == 2
+
+
+async def test_stale_ticket_renewed_when_looking_up_list(fake_ica, account, client):
+    """A ticket rejected while looking up the list id is renewed."""
+    account.ticket = "stale"
+
+    result = await client.get_request(URI)
+
+    assert len(result["Rows"]) == 3
+    assert fake_ica.logins == 1
+    assert account.lists[LIST_NAME] == client.listId
+
+
+async def test_list_found_again_after_404(fake_ica, account, client):
+    """A list id ICA no longer knows is looked up again by title."""
+    await client.get_request(URI)
+    old_id = client.listId
+    new_id = fake_ica.add_list(LIST_NAME, fake_ica.lists.pop(old_id)["Rows"])
+
+    result = await client.get_request(URI)
+
+    assert len(result["Rows"]) == 3
+    assert client.listId == new_id
+    assert account.lists[LIST_NAME] == new_id
+
+
+async def test_list_created_again_after_404(fake_ica, client):
+    """A list removed in the app is created again."""
+    await client.get_request(URI)
+    fake_ica.lists.clear()
+
+    result = await client.get_request(URI)
+
+    assert result["Rows"] == []
+    assert [lst["Title"] for lst in fake_ica.lists.values()] == [LIST_NAME]
+
+
+async def test_list_looked_up_again_once(fake_ica, client):
+    """A list that keeps answering 404 is looked up again only once."""
+    await client.get_request(URI)
+    fake_ica.fail(404, times=2, path=f"{URI}/{client.listId}")
+
+    assert await client.get_request(URI) is None
+    assert fake_ica.count("GET", client.listId) == 3
+    assert fake_ica.count("GET", URI) == 2
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Return a list holding the time the circuit breaker sees."""
+    now = [1000.0]
+    monkeypatch.setattr(api.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_after_threshold(clock):
+    """The breaker opens after failure_threshold failures in a row."""
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow_request()
+    clock[0] += 59
+    assert not breaker.allow_request()
+
+
+def test_breaker_lets_one_probe_through(clock):
+    """Once recovery_timeout has passed a single probe is let through."""
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+    breaker.record_failure()
+    clock[0] += 60
+
+    assert breaker.allow_request()
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+def test_breaker_failed_probe_opens_again(clock):
+    """A failed probe opens the breaker for another recovery_timeout."""
+    breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=60)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 60
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow_request()
+    clock[0] += 60
+    assert breaker.allow_request()
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Retry without waiting."""
+    monkeypatch.setattr(api, "RETRY_BACKOFF", 0)
+
+
+async def test_open_breaker_fails_fast(fake_ica, account, client, no_backoff):
+    """Requests are not sent while the breaker is open, and one probe closes it."""
+    await client.get_request(URI)
+    account.retries = 0
+    account.breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    fake_ica.fail(500, times=2)
+
+    assert await client.get_request(URI) is None
+    assert await client.get_request(URI) is None
+    assert account.breaker.state == STATE_OPEN
+    sent = len(fake_ica.requests)
+
+    assert await client.get_request(URI) is None
+    assert await client.post_request(URI, SYNC, "/sync") is None
+    assert len(fake_ica.requests) == sent
+
+    account.breaker.opened -= 60
+    fake_ica.latency = 0.05
+    results = await asyncio.gather(*(client.get_request(URI) for _ in range(3)))
+
+    assert [result is not None for result in results].count(True) == 1
+    assert len(fake_ica.requests) == sent + 1
+    assert account.breaker.state == STATE_CLOSED
+    assert await client.get_request(URI) is not None
+
+
+async def test_list_lookup_is_retried(fake_ica, client, no_backoff):
+    """A server error looking up the list id is retried."""
+    fake_ica.fail(503, method="GET", path=URI)
+
+    result = await client.get_request(URI)
+
+    assert len(result["Rows"]) == 3
+    assert fake_ica.count("GET", URI) == 2
+    assert len(fake_ica.lists) == 1
+
+
+async def test_failed_list_lookup_creates_no_list(fake_ica, account, client, no_backoff):
+    """A list lookup ICA answers with an error is not taken for a missing list."""
+    account.retries = 0
+    fake_ica.fail(503, method="GET", path=URI)
+
+    assert await client.get_request(URI) is None
+    assert fake_ica.count("POST", URI) == 0
+
+    result = await client.get_request(URI)
+
+    assert len(result["Rows"]) == 3
+    assert len(fake_ica.lists) == 1
+
+
+async def test_get_retries_network_errors(fake_ica, account, client, no_backoff):
+    """GET requests are retried when the connection drops."""
+    await client.get_request(URI)
+    account.retries = 1
+    fake_ica.fail(None, method="GET")
+
+    result = await client.get_request(URI)
+
+    assert len(result["Rows"]) == 3
+    assert fake_ica.count("GET", client.listId) == 3
+
+
+async def test_post_does_not_retry_network_errors(fake_ica, account, client, no_backoff):
+    """POST requests are not retried when the connection drops, ICA may have applied them."""
+    await client.get_request(URI)
+    account.retries = 1
+    fake_ica.fail(None, method="POST")
+
+    assert await client.post_request(URI, SYNC, "/sync") is None
+    assert fake_ica.count("POST", "/sync") == 1
+
+
+async def test_server_errors_are_retried(fake_ica, account, client, no_backoff):
+    """Server errors are retried for every method."""
+    await client.get_request(URI)
+    account.retries = 2
+    fake_ica.fail(503, times=2, method="POST")
+
+    result = await client.post_request(URI, SYNC, "/sync")
+
+    assert len(result["Rows"]) == 3
+    assert fake_ica.count("POST", "/sync") == 3
+
+
+@pytest.mark.parametrize("status", [408, 429, 503])
+async def test_busy_answers_are_retried(fake_ica, account, client, no_backoff, status):
+    """Timeouts, rate limits and server errors are retried, also for POST."""
+    await client.get_request(URI)
+    fake_ica.fail(status, method="POST")
+
+    result = await client.post_request(URI, SYNC, "/sync")
+
+    assert len(result["Rows"]) == 3
+    assert fake_ica.count("POST", "/sync") == 2
+
+
+@pytest.mark.parametrize("status", [400, 422])
+async def test_refused_requests_raise(fake_ica, client, status):
+    """Requests whose content ICA refuses raise IcaRejectedError."""
+    await client.get_request(URI)
+    fake_ica.fail(status, method="POST")
+
+    with pytest.raises(IcaRejectedError):
+        await client.post_request(URI, SYNC, "/sync")
+
+
+async def test_other_client_errors_return_none(fake_ica, client):
+    """Other client errors are failures, not rejections."""
+    await client.get_request(URI)
+    fake_ica.fail(403, method="POST")
+
+    assert await client.post_request(URI, SYNC, "/sync") is None
@@ -0,0 +1,137 @@
+"""Tests of polling ICA lists in the background."""
+from datetime import timedelta
+
+import pytest
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.util import dt as dt_util
+
+from custom_components.ica_shopping_list.coordinator import JITTER, ListPoller
+
+MIN_INTERVAL = 30
+MAX_INTERVAL = 120
+
+
+class FakeList:
+    """List whose reconciles return, or raise, queued results."""
+
+    name = "Inköp"
+
+    def __init__(self):
+        """Initialize the list without results."""
+        self.results = []
+        self.calls = 0
+
+    async def async_reconcile(self):
+        """Return the next result, or raise it if it is an exception."""
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture
+def shopping_list():
+    """Return a list to poll."""
+    return FakeList()
+
+
+@pytest.fixture
+def poller(hass, shopping_list):
+    """Return a started poller of the list."""
+    poller = ListPoller(hass, shopping_list, MIN_INTERVAL, MAX_INTERVAL)
+    poller.async_start()
+    yield poller
+    poller.async_stop()
+
+
+async def _next_poll(hass, poller):
+    """Move time past the next poll and wait for it."""
+    delay = poller.interval * (1 + JITTER) + 1
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=delay))
+    await hass.async_block_till_done()
+
+
+async def test_unchanged_polls_back_off(hass, shopping_list, poller):
+    """The interval doubles after every unchanged poll, up to max_interval."""
+    shopping_list.results = [False, False, False]
+    intervals = []
+    for _ in range(3):
+        await _next_poll(hass, poller)
+        intervals.append(poller.interval)
+
+    assert shopping_list.calls == 3
+    assert intervals == [60, 120, 120]
+
+
+async def test_change_resets_interval(hass, shopping_list, poller):
+    """A poll that finds changes polls quickly again."""
+    shopping_list.results = [False, False, True]
+    for _ in range(3):
+        await _next_poll(hass, poller)
+
+    assert poller.interval == MIN_INTERVAL
+
+
+async def test_activity_resets_interval(hass, shopping_list, poller):
+    """Changing the list locally polls quickly again."""
+    shopping_list.results = [False, False, False]
+    await _next_poll(hass, poller)
+    await _next_poll(hass, poller)
+
+    poller.async_activity()
+
+    assert poller.interval == MIN_INTERVAL
+    async_fire_time_changed(
+        hass, dt_util.utcnow() + timedelta(seconds=MIN_INTERVAL * (1 + JITTER) + 1)
+    )
+    await hass.async_block_till_done()
+    assert shopping_list.calls == 3
+
+
+async def test_failed_polls_back_off_and_go_on(hass, shopping_list, poller):
+    """Polls that fail or raise back off and polling goes on."""
+    shopping_list.results = [None, KeyError("SourceId"), True]
+
+    await _next_poll(hass, poller)
+    await _next_poll(hass, poller)
+    assert poller.interval == MAX_INTERVAL
+    await _next_poll(hass, poller)
+
+    assert shopping_list.calls == 3
+    assert poller.stats["failures"] == 2
+    assert poller.interval == MIN_INTERVAL
+
+
+async def test_stats(hass, shopping_list, poller):
+    """The stats count polls and report their latency."""
+    assert poller.stats == {
+        "polls": 0,
+        "unchanged": 0,
+        "failures": 0,
+        "interval": MIN_INTERVAL,
+        "last_latency": None,
+        "average_latency": None,
+    }
+    shopping_list.results = [False, None]
+
+    await _next_poll(hass, poller)
+    await _next_poll(hass, poller)
+
+    stats = poller.stats
+    assert stats["polls"] == 2
+    assert stats["unchanged"] == 1
+    assert stats["failures"] == 1
+    assert stats["interval"] == MAX_INTERVAL
+    assert stats["last_latency"] >= 0
+    assert stats["average_latency"] >= 0
+
+
+async def test_stopped_poller_does_not_poll(hass, shopping_list, poller):
+    """No poll is made once the poller is stopped."""
+    poller.async_stop()
+
+    await _next_poll(hass, poller)
+
+    assert shopping_list.calls == 0
@@ -0,0 +1,547 @@
+"""Tests of the shopping list against a stand-in of the ICA API."""
+import asyncio
+from datetime import timedelta
+import os
+
+import pytest
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.setup import async_setup_component
+from homeassistant.util import dt as dt_util, slugify
+
+from custom_components.ica_shopping_list import (
+    DOMAIN,
+    JOURNAL,
+    SNAPSHOT_SAVE_DELAY,
+    SNAPSHOT_STORAGE_KEY,
+    WS_TYPE_SHOPPING_LIST_ADD_ITEM,
+    WS_TYPE_SHOPPING_LIST_BULK_ADD,
+    WS_TYPE_SHOPPING_LIST_BULK_COMPLETE,
+    WS_TYPE_SHOPPING_LIST_BULK_REMOVE,
+    WS_TYPE_SHOPPING_LIST_ITEMS,
+    WS_TYPE_SHOPPING_LIST_SUBSCRIBE,
+)
+from custom_components.ica_shopping_list import codec, store
+from custom_components.ica_shopping_list.journal import MutationJournal
+
+from .conftest import LIST_NAME
+from .fake_ica import make_rows
+
+
+async def test_setup_fetches_list(hass, fake_ica, setup_integration):
+    """The list is fetched from api_url once set up."""
+    list_id = fake_ica.add_list(LIST_NAME, make_rows(3))
+    data = await setup_integration()
+
+    assert data.loaded
+    assert [item.id for item in data.items] == [row["OfflineId"] for row in fake_ica.rows(list_id)]
+    assert fake_ica.logins == 1
+
+
+async def test_setup_creates_missing_list(hass, fake_ica, setup_integration):
+    """A list that does not exist is created."""
+    await setup_integration()
+
+    assert [lst["Title"] for lst in fake_ica.lists.values()] == [LIST_NAME]
+
+
+@pytest.mark.parametrize("other", ["Inkop", "INKÖP"])
+async def test_list_names_must_not_share_files(hass, fake_ica, other, caplog):
+    """Lists whose names would share a snapshot and journal are refused."""
+    assert await async_setup_component(hass, "http", {})
+    config = {
+        "accounts": [
+            {
+                "username": fake_ica.username,
+                "password": fake_ica.password,
+                "lists": [{"listname": LIST_NAME}, {"listname": other}],
+            }
+        ],
+        "api_url": fake_ica.url,
+    }
+
+    assert not await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    assert "ignoring case and accents" in caplog.text
+
+
+async def test_add_item_syncs(hass, fake_ica, setup_integration):
+    """Added items are shown at once and sent to ICA."""
+    list_id = fake_ica.add_list(LIST_NAME)
+    data = await setup_integration()
+
+    await hass.services.async_call(DOMAIN, "add_item", {"name": "mjölk"}, blocking=True)
+    assert [item.name for item in data.items] == ["Mjölk"]
+    await hass.async_block_till_done()
+
+    assert [row["ProductName"] for row in fake_ica.rows(list_id)] == ["mjölk"]
+    assert fake_ica.count("POST", "/sync") == 1
+
+
+async def test_view_get(hass, hass_client, fake_ica, setup_integration):
+    """The REST view returns the items and honours If-None-Match."""
+    fake_ica.add_list(LIST_NAME, make_rows(2))
+    await setup_integration()
+    client = await hass_client()
+
+    resp = await client.get("/api/shopping_list")
+    assert resp.status == 200
+    assert [item["name"] for item in await resp.json()] == ["Item 0", "Item 1"]
+
+    resp = await client.get(
+        "/api/shopping_list", headers={"If-None-Match": resp.headers["ETag"]}
+    )
+    assert resp.status == 304
+
+
+async def test_websocket_add_and_items(hass, hass_ws_client, fake_ica, setup_integration):
+    """Items added over the websocket API are returned by it."""
+    list_id = fake_ica.add_list(LIST_NAME)
+    await setup_integration()
+    client = await hass_ws_client(hass)
+
+    await client.send_json_auto_id({"type": WS_TYPE_SHOPPING_LIST_ADD_ITEM, "name": "bröd"})
+    resp = await client.receive_json()
+    assert resp["success"]
+
+    await client.send_json_auto_id({"type": WS_TYPE_SHOPPING_LIST_ITEMS})
+    resp = await client.receive_json()
+    assert [item["name"] for item in resp["result"]] == ["Bröd"]
+    await hass.async_block_till_done()
+    assert [row["ProductName"] for row in fake_ica.rows(list_id)] == ["bröd"]
+
+
+async def test_websocket_items_serialized_once(
+    hass, hass_ws_client, fake_ica, setup_integration, monkeypatch
+):
+    """The items are serialized once for every client and sort until they change."""
+    fake_ica.add_list(LIST_NAME, make_rows(2))
+    await setup_integration()
+    encoded = []
+    monkeypatch.setattr(store, "dumps", lambda obj: encoded.append(obj) or codec.dumps(obj))
+
+    for _ in range(2):
+        client = await hass_ws_client(hass)
+        for sort in ({}, {"sort": "store"}):
+            await client.send_json_auto_id({"type": WS_TYPE_SHOPPING_LIST_ITEMS, **sort})
+            resp = await client.receive_json()
+            assert resp["success"]
+            assert [item["name"] for item in resp["result"]] == ["Item 0", "Item 1"]
+
+    assert len(encoded) == 2
+
+
+async def test_websocket_subscribe(hass, hass_ws_client, fake_ica, setup_integration):
+    """Subscribers get all items once, then only the changes, until they unsubscribe."""
+    fake_ica.add_list(LIST_NAME, make_rows(2))
+    data = await setup_integration()
+    first, second = data.items
+    client = await hass_ws_client(hass)
+
+    await client.send_json_auto_id({"type": WS_TYPE_SHOPPING_LIST_SUBSCRIBE})
+    resp = await client.receive_json()
+    assert resp["success"]
+    subscription = resp["id"]
+
+    async def next_event():
+        msg = await client.receive_json()
+        assert msg["id"] == subscription
+        assert msg["type"] == "event"
+        return msg["event"]
+
+    event = await next_event()
+    assert [item["name"] for item in event["items"]] == ["Item 0", "Item 1"]
+    assert event["version"] == data.version
+
+    await data.async_add("ost")
+    event = await next_event()
+    assert [item["name"] for item in event["added"]] == ["Ost"]
+    assert event["changed"] == event["removed"] == []
+
+    await data.async_update(first.id, {"complete": True})
+    event = await next_event()
+    assert [(item["id"], item["complete"]) for item in event["changed"]] == [(first.id, True)]
+    assert event["added"] == event["removed"] == []
+
+    await data.async_clear_completed()
+    event = await next_event()
+    assert event["removed"] == [first.id]
+    assert event["added"] == event["changed"] == []
+    assert event["version"] == data.version
+    await hass.async_block_till_done()
+
+    await client.send_json_auto_id({"type": "unsubscribe_events", "subscription": subscription})
+    resp = await client.receive_json()
+    assert resp["success"]
+    assert data._listeners == []
+
+    await data.async_update(second.id, {"name": "Bröd"})
+    await client.send_json_auto_id({"type": WS_TYPE_SHOPPING_LIST_ITEMS})
+    resp = await client.receive_json()
+    assert resp["type"] == "result"
+
+
+def _outcomes(results):
+    """Return the name, success and error of every bulk result."""
+    return [(result["name"], result["success"], result["error"]) for result in results]
+
+
+async def test_bulk_services_return_results(hass, fake_ica, setup_integration):
+    """The bulk services return a result per name, also for names that failed."""
+    list_id = fake_ica.add_list(LIST_NAME, make_rows(1, "Ost"))
+    await setup_integration()
+
+    async def call(service, names, **data):
+        response = await hass.services.async_call(
+            DOMAIN, service, {"names": names, **data}, blocking=True, return_response=True
+        )
+        return response["results"]
+
+    results = await call("add_items", ["mjölk", "bröd"])
+    assert _outcomes(results) == [("mjölk", True, None), ("bröd", True, None)]
+    assert results[0]["item"]["name"] == "Mjölk"
+
+    results = await call("complete_items", ["mjölk", "kaffe"])
+    assert _outcomes(results) == [("mjölk", True, None), ("kaffe", False, "not_found")]
+    assert results[0]["item"]["complete"] is True
+
+    results = await call("remove_items", ["ost 0", "kaffe"])
+    assert _outcomes(results) == [("ost 0", True, None), ("kaffe", False, "not_found")]
+
+    results = await call("add_items", ["te"], list="Okänd")
+    assert _outcomes(results) == [("te", False, "list_not_found")]
+
+    await hass.async_block_till_done()
+    rows = fake_ica.rows(list_id)
+    assert [(row["ProductName"], row["IsStrikedOver"]) for row in rows] == [
+        ("mjölk", True),
+        ("bröd", False),
+    ]
+
+
+async def test_websocket_bulk(hass, hass_ws_client, fake_ica, setup_integration):
+    """The bulk websocket commands return a result per name."""
+    fake_ica.add_list(LIST_NAME, make_rows(1, "Ost"))
+    data = await setup_integration()
+    client = await hass_ws_client(hass)
+
+    async def command(ws_type, names):
+        await client.send_json_auto_id({"type": ws_type, "names": names})
+        resp = await client.receive_json()
+        assert resp["success"], resp
+        return _outcomes(resp["result"])
+
+    assert await command(WS_TYPE_SHOPPING_LIST_BULK_ADD, ["mjölk", "bröd"]) == [
+        ("mjölk", True, None),
+        ("bröd", True, None),
+    ]
+    assert await command(WS_TYPE_SHOPPING_LIST_BULK_COMPLETE, ["bröd", "kaffe"]) == [
+        ("bröd", True, None),
+        ("kaffe", False, "not_found"),
+    ]
+    assert await command(WS_TYPE_SHOPPING_LIST_BULK_REMOVE, ["ost 0", "te"]) == [
+        ("ost 0", True, None),
+        ("te", False, "not_found"),
+    ]
+    assert [(item.name, item.complete) for item in data.items] == [
+        ("Mjölk", False),
+        ("Bröd", True),
+    ]
+
+
+def _snapshot_key():
+    """Return the storage key of the snapshot of the list."""
+    return SNAPSHOT_STORAGE_KEY.format(slugify(LIST_NAME))
+
+
+async def test_snapshot_saved(hass, hass_storage, fake_ica, setup_integration):
+    """The items are saved a moment after they change."""
+    fake_ica.add_list(LIST_NAME, make_rows(2))
+    await setup_integration()
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=SNAPSHOT_SAVE_DELAY + 1))
+    await hass.async_block_till_done()
+
+    assert [item["name"] for item in hass_storage[_snapshot_key()]["data"]] == ["Item 0", "Item 1"]
+
+
+async def test_snapshot_loaded(hass, hass_storage, fake_ica, setup_integration):
+    """The saved items are shown while ICA cannot be reached."""
+    fake_ica.add_list(LIST_NAME, make_rows(2))
+    fake_ica.fail(500, times=100)
+    hass_storage[_snapshot_key()] = {
+        "version": 1,
+        "key": _snapshot_key(),
+        "data": [{"name": "Ost", "id": "a", "complete": False, "SourceId": -1}],
+    }
+
+    data = await setup_integration(retries=0)
+
+    assert [item.name for item in data.items] == ["Ost"]
+
+
+async def test_damaged_snapshot_does_not_block_loading(
+    hass, hass_storage, fake_ica, setup_integration
+):
+    """A snapshot of the wrong shape is skipped and the list fetched from ICA."""
+    fake_ica.add_list(LIST_NAME, make_rows(2))
+    hass_storage[_snapshot_key()] = {"version": 1, "key": _snapshot_key(), "data": [{"name": "x"}]}
+
+    data = await setup_integration()
+
+    assert data.loaded
+    assert len(data.items) == 2
+
+
+async def test_unreadable_journal_does_not_block_loading(hass, fake_ica, setup_integration):
+    """A journal that cannot be read is skipped and the list fetched from ICA."""
+    fake_ica.add_list(LIST_NAME, make_rows(2))
+    os.mkdir(hass.config.path(JOURNAL.format(slugify(LIST_NAME))))
+
+    data = await setup_integration()
+
+    assert data.loaded
+    assert len(data.items) == 2
+
+
+async def test_damaged_login_does_not_block_loading(
+    hass, hass_storage, fake_ica, setup_integration
+):
+    """Stored login data of the wrong shape is skipped and a new login made."""
+    fake_ica.add_list(LIST_NAME, make_rows(2))
+    key = f"ica_shopping_list.auth.{fake_ica.username}"
+    hass_storage[key] = {"version": 1, "key": key, "data": []}
+
+    data = await setup_integration()
+
+    assert data.loaded
+    assert len(data.items) == 2
+    assert fake_ica.logins == 1
+
+
+async def test_failed_reconcile_does_not_stop_other_lists(hass, fake_ica, caplog):
+    """A list that cannot be reconciled does not keep the other lists from polling."""
+    broken = make_rows(1)
+    del broken[0]["SourceId"]
+    fake_ica.add_list(LIST_NAME, broken)
+    fake_ica.add_list("Fest", make_rows(2))
+    config = {
+        "accounts": [
+            {
+                "username": fake_ica.username,
+                "password": fake_ica.password,
+                "lists": [{"listname": LIST_NAME}, {"listname": "Fest"}],
+            }
+        ],
+        "api_url": fake_ica.url,
+    }
+
+    assert await async_setup_component(hass, "http", {})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    await hass.async_block_till_done()
+
+    lists = hass.data[DOMAIN]
+    assert len(lists["Fest"].items) == 2
+    assert "Failed to fetch Inköp from ICA" in caplog.text
+    for data in lists.values():
+        assert data.poller._unsub is not None
+        data.poller.async_stop()
+
+
+async def test_local_changes_touch_only_their_items(
+    hass, fake_ica, setup_integration, monkeypatch
+):
+    """Adding, updating and removing items neither diffs nor serializes the whole list."""
+    fake_ica.add_list(LIST_NAME, make_rows(3))
+    data = await setup_integration()
+    changes = []
+    data.async_add_listener(lambda *change: changes.append(change))
+
+    whole_list = []
+    store = data._store
+    with monkeypatch.context() as patch:
+        patch.setattr(store, "apply", lambda *args: whole_list.append("apply"))
+        as_dicts = store.as_dicts
+        patch.setattr(
+            store, "as_dicts", lambda *args: whole_list.append("as_dicts") or as_dicts(*args)
+        )
+
+        added = await data.async_add("ost")
+        updated = await data.async_update(added["id"], {"complete": True})
+        await data.async_remove_items(["item 0"])
+
+        assert whole_list == []
+    assert added["name"] == "Ost"
+    assert updated == {**added, "complete": True}
+    assert [[len(items) for items in change] for change in changes] == [
+        [1, 0, 0],
+        [0, 1, 0],
+        [0, 0, 1],
+    ]
+    await hass.async_block_till_done()
+    assert [item.name for item in data.items] == ["Item 1", "Item 2", "Ost"]
+
+
+async def test_repeated_add_is_deduplicated(hass, fake_ica, setup_integration):
+    """Adding a name again within the dedup window returns the item already added."""
+    list_id = fake_ica.add_list(LIST_NAME)
+    data = await setup_integration()
+
+    first = await data.async_add("mjölk")
+    second = await data.async_add(" Mjölk ")
+    await hass.async_block_till_done()
+
+    assert second == first
+    assert [row["ProductName"] for row in fake_ica.rows(list_id)] == ["mjölk"]
+    assert fake_ica.count("POST", "/sync") == 1
+
+
+async def test_dedup_window_zero_adds_every_time(hass, fake_ica, setup_integration):
+    """A dedup window of 0 adds a row for every add."""
+    list_id = fake_ica.add_list(LIST_NAME)
+    data = await setup_integration(dedup_window=0)
+
+    await data.async_add("mjölk")
+    await data.async_add("mjölk")
+    await hass.async_block_till_done()
+
+    assert [item.name for item in data.items] == ["Mjölk", "Mjölk"]
+    assert len(fake_ica.rows(list_id)) == 2
+
+
+async def test_add_after_completing_creates_row(hass, fake_ica, setup_integration):
+    """Adding an item again right after completing it adds a new row."""
+    list_id = fake_ica.add_list(LIST_NAME)
+    data = await setup_integration()
+
+    first = await data.async_add("mjölk")
+    await data.async_update(first["id"], {"complete": True})
+    second = await data.async_add("mjölk")
+    await hass.async_block_till_done()
+
+    assert second["id"] != first["id"]
+    assert [(item.name, item.complete) for item in data.items] == [
+        ("Mjölk", True),
+        ("Mjölk", False),
+    ]
+    assert len(fake_ica.rows(list_id)) == 2
+
+
+async def test_add_after_rollback_creates_row(hass, fake_ica, setup_integration):
+    """Adding an item again after ICA rejected it sends a new row."""
+    list_id = fake_ica.add_list(LIST_NAME)
+    fake_ica.rejected_names = {"mjölk"}
+    data = await setup_integration()
+
+    await data.async_add("mjölk")
+    await hass.async_block_till_done()
+    assert data.items == ()
+
+    fake_ica.rejected_names = set()
+    await data.async_add("mjölk")
+    await hass.async_block_till_done()
+
+    assert [item.name for item in data.items] == ["Mjölk"]
+    assert [row["ProductName"] for row in fake_ica.rows(list_id)] == ["mjölk"]
+    assert fake_ica.count("POST", "/sync") == 2
+
+
+async def test_rejected_row_is_undone(hass, fake_ica, setup_integration, caplog):
+    """Only the rows ICA rejects are undone when a batch is rejected."""
+    list_id = fake_ica.add_list(LIST_NAME)
+    fake_ica.rejected_names = {"trasig"}
+    data = await setup_integration()
+
+    await data.async_add_items(["mjölk", "trasig", "ost"])
+    assert [item.name for item in data.items] == ["Mjölk", "Trasig", "Ost"]
+    await hass.async_block_till_done()
+
+    assert [item.name for item in data.items] == ["Mjölk", "Ost"]
+    assert sorted(row["ProductName"] for row in fake_ica.rows(list_id)) == ["mjölk", "ost"]
+    assert "undoing them: trasig" in caplog.text
+    assert not data._pending
+
+
+async def test_single_rejected_row_is_sent_once(hass, fake_ica, setup_integration):
+    """A rejected batch of one row is undone without sending it again."""
+    fake_ica.add_list(LIST_NAME)
+    fake_ica.rejected_names = {"trasig"}
+    data = await setup_integration()
+
+    await data.async_add("trasig")
+    await hass.async_block_till_done()
+
+    assert data.items == ()
+    assert fake_ica.count("POST", "/sync") == 1
+
+
+async def test_rate_limited_changes_are_kept(hass, fake_ica, setup_integration):
+    """Changes ICA answers 429 to are kept and sent again, not undone."""
+    list_id = fake_ica.add_list(LIST_NAME)
+    data = await setup_integration(retries=0)
+    fake_ica.fail(429, method="POST")
+
+    await data.async_add("mjölk")
+    await hass.async_block_till_done()
+    assert [item.name for item in data.items] == ["Mjölk"]
+    assert fake_ica.rows(list_id) == []
+
+    await data.async_reconcile()
+    assert [row["ProductName"] for row in fake_ica.rows(list_id)] == ["mjölk"]
+    assert [item.name for item in data.items] == ["Mjölk"]
+
+
+async def test_journal_replay_with_one_bad_row(hass, fake_ica, setup_integration):
+    """Replaying the journal after a restart keeps the rows ICA accepts."""
+    list_id = fake_ica.add_list(LIST_NAME)
+    fake_ica.rejected_names = {"trasig"}
+    journal = MutationJournal(hass.config.path(JOURNAL.format(slugify(LIST_NAME))))
+    for index, name in enumerate(["mjölk", "trasig", "ost"]):
+        journal.append(
+            {"CreatedRows": [{"OfflineId": str(index), "ProductName": name, "SourceId": -1}]}
+        )
+
+    data = await setup_integration()
+
+    assert [item.name for item in data.items] == ["Mjölk", "Ost"]
+    assert sorted(row["ProductName"] for row in fake_ica.rows(list_id)) == ["mjölk", "ost"]
+    assert journal.load().payload() == {}
+
+
+async def test_concurrent_adds_and_reads(hass, hass_client, fake_ica, setup_integration):
+    """Hundreds of concurrent adds and reads see consistent items and all reach ICA."""
+    list_id = fake_ica.add_list(LIST_NAME, make_rows(50))
+    data = await setup_integration(sync_delay=0.01)
+    fake_ica.latency = 0.005
+    client = await hass_client()
+    names = [f"Vara {index}" for index in range(300)]
+
+    async def add(index, name):
+        await asyncio.sleep(index % 20 * 0.005)
+        await data.async_add(name)
+
+    async def read():
+        versions = []
+        for _ in range(20):
+            items = data.items
+            version = data.version
+            resp = await client.get("/api/shopping_list")
+            assert resp.status == 200
+            ids = [item["id"] for item in await resp.json()]
+            assert len(ids) == len(set(ids))
+            assert data.items is items or data.version != version
+            versions.append(version)
+        return versions
+
+    results = await asyncio.gather(
+        *(add(index, name) for index, name in enumerate(names)),
+        *(read() for _ in range(10)),
+    )
+    await hass.async_block_till_done()
+
+    for versions in results[len(names):]:
+        assert versions == sorted(versions)
+    expected = sorted([f"Item {index}" for index in range(50)] + names)
+    assert sorted(item.name for item in data.items) == expected
+    assert sorted(row["ProductName"] for row in fake_ica.rows(list_id)) == expected
+    assert fake_ica.count("POST", "/sync") > 1
+    assert not data._pending
@@ -0,0 +1,87 @@
+"""Tests of the journal of unsent mutations."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from homeassistant.util import slugify
+
+from custom_components.ica_shopping_list import JOURNAL
+from custom_components.ica_shopping_list.journal import MutationJournal
+
+from .conftest import LIST_NAME
+
+ROW = {"OfflineId": "a", "ProductName": "Mjölk", "IsStrikedOver": "false", "SourceId": -1}
+
+
+def test_load_skips_damaged_entries(tmp_path):
+    """Entries that are not JSON or not shaped like a sync body are skipped."""
+    path = tmp_path / "journal"
+    path.write_bytes(
+        b"\n".join(
+            [
+                b'{"CreatedRows":[{"OfflineId":"a","ProductName":"Mj\xc3\xb6lk"}]}',
+                b'{"CreatedRows":[{"OfflineId":',
+                b"[]",
+                b'"text"',
+                b'{"CreatedRows":{"OfflineId":"b"}}',
+                b'{"CreatedRows":[{"ProductName":"Ost"}]}',
+                b'{"CreatedRows":[{"OfflineId":"c"}]}',
+                b'{"ChangedRows":[{"OfflineId":"a","ProductName":5}]}',
+                b'{"ChangedRows":["a"]}',
+                b'{"DeletedRows":[{"OfflineId":"a"}]}',
+                b'{"DeletedRows":["d"]}',
+                b"",
+            ]
+        )
+    )
+
+    payload = MutationJournal(str(path)).load().payload()
+
+    assert payload == {
+        "CreatedRows": [{"OfflineId": "a", "ProductName": "Mjölk"}],
+        "DeletedRows": ["d"],
+    }
+
+
+def test_rewrite_and_append(tmp_path):
+    """A rewrite replaces every entry and an empty rewrite removes the file."""
+    journal = MutationJournal(str(tmp_path / "journal"))
+    journal.append({"CreatedRows": [ROW]})
+    journal.append({"DeletedRows": ["b"]})
+    assert journal.load().payload() == {"CreatedRows": [ROW], "DeletedRows": ["b"]}
+
+    journal.rewrite({"DeletedRows": ["c"]})
+    assert journal.load().payload() == {"DeletedRows": ["c"]}
+
+    journal.rewrite({})
+    assert not (tmp_path / "journal").exists()
+
+
+def test_concurrent_rewrites(tmp_path):
+    """Rewrites from several threads never fail and leave one whole entry."""
+    journal = MutationJournal(str(tmp_path / "journal"))
+    payloads = [{"DeletedRows": [str(index)]} for index in range(200)]
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(journal.rewrite, payloads))
+
+    assert journal.load().payload() in payloads
+    assert os.listdir(tmp_path) == ["journal"]
+
+
+async def test_journal_keeps_changes_while_offline(hass, fake_ica, setup_integration):
+    """Batches appended while a failed sync rewrites the journal are all kept."""
+    fake_ica.add_list(LIST_NAME)
+    data = await setup_integration(sync_delay=0, retries=0)
+    fake_ica.fail(500, times=1000, method="POST")
+    fake_ica.latency = 0.01
+
+    names = [f"Item {index}" for index in range(30)]
+    for name in names:
+        await data.async_add(name)
+        await asyncio.sleep(0.002)
+    await hass.async_block_till_done()
+
+    journal = MutationJournal(hass.config.path(JOURNAL.format(slugify(LIST_NAME))))
+    created = journal.load().payload()["CreatedRows"]
+    assert sorted(row["ProductName"] for row in created) == sorted(names)
@@ -0,0 +1,139 @@
+"""Tests of looking up items by name."""
+import pytest
+
+from custom_components.ica_shopping_list import DOMAIN
+from custom_components.ica_shopping_list.matcher import fold_name
+from custom_components.ica_shopping_list.store import ItemStore, ShoppingItem
+
+from .conftest import LIST_NAME
+from .fake_ica import make_rows
+
+
+def _store(*names):
+    """Return a store of incomplete items with the names, ids their index."""
+    return ItemStore(ShoppingItem(str(index), name, False, -1) for index, name in enumerate(names))
+
+
+def _name(item):
+    """Return the name of an item, or None."""
+    return None if item is None else item.name
+
+
+@pytest.mark.parametrize(
+    ("singular", "plural"),
+    [
+        ("Gurka", "Gurkor"),
+        ("Banan", "Bananer"),
+        ("Bulle", "Bullar"),
+        ("Lök", "Lökar"),
+        ("Tomat", "Tomater"),
+        ("Paprika", "Paprikor"),
+    ],
+)
+def test_fold_plurals(singular, plural):
+    """Singular and plural fold alike."""
+    assert fold_name(singular) == fold_name(plural)
+
+
+def test_fold_name():
+    """Diacritics, case and spacing are folded away, but not other endings."""
+    assert fold_name(" Mjölk ") == fold_name("mjolk")
+    assert fold_name("Glass") != fold_name("glas")
+    assert fold_name("Potatis") != fold_name("potati")
+    assert fold_name("Bröderna") != fold_name("bröd")
+
+
+@pytest.mark.parametrize(
+    ("query", "name"),
+    [
+        ("korv", "Korvbröd"),
+        ("kaffe", "Kaffefilter"),
+        ("ägg", "Äggnudlar"),
+        ("mjölk", "Filmjölk"),
+        ("bröd", "Bröderna"),
+        ("mjöl", "Mjölk"),
+        ("glas", "Glass"),
+    ],
+)
+def test_different_products_do_not_match(query, name):
+    """Names that merely overlap another product match neither way."""
+    store = _store(name)
+
+    assert store.find_folded(query) is None
+    assert store.match(query) is None
+
+
+@pytest.mark.parametrize(
+    ("query", "name"),
+    [
+        ("mjolk", "Mjölk"),
+        ("MJÖLK", "Mjölk"),
+        ("tomat", "Tomater"),
+        ("bananer", "Banan"),
+        ("gurkor", "Gurka"),
+        ("lök", "Lökar"),
+    ],
+)
+def test_folded_names_match(query, name):
+    """Names equal but for diacritics, case and plurals match."""
+    store = _store("Ost", name)
+
+    assert _name(store.find_folded(query)) == name
+    assert _name(store.match(query)) == name
+
+
+def test_similar_name_matches_only_for_match():
+    """A misspelt name is matched by similarity, but not by find_folded."""
+    store = _store("Ost", "Mjölk")
+
+    assert store.find_folded("mjölkk") is None
+    assert _name(store.match("mjölkk")) == "Mjölk"
+    assert store.match("mjölkk", threshold=0.9) is None
+
+
+def test_ambiguous_similar_name_matches_nothing():
+    """A name almost as similar to two products matches neither."""
+    assert _name(_store("Yoghurt").match("yoghurtt")) == "Yoghurt"
+    assert _store("Yoghurt", "Yoghurten").match("yoghurtt") is None
+
+
+def test_match_prefers_incomplete_and_skips_excluded():
+    """Of items with the same name the oldest incomplete one not excluded wins."""
+    store = ItemStore(
+        [
+            ShoppingItem("a", "Tomater", True, -1),
+            ShoppingItem("b", "Tomat", False, -1),
+            ShoppingItem("c", "Tomat", False, -1),
+        ]
+    )
+
+    assert store.match("tomatr").id == "b"
+    assert store.match("tomatr", exclude={"b"}).id == "c"
+    assert store.find_folded("tomat", exclude={"b", "c"}).id == "a"
+
+
+async def test_remove_items_does_not_guess(hass, fake_ica, setup_integration):
+    """remove_items leaves items that only resemble the given names."""
+    rows = make_rows(1, "Korvbröd") + make_rows(1, "Mjölk")
+    list_id = fake_ica.add_list(LIST_NAME, rows)
+    data = await setup_integration()
+
+    await hass.services.async_call(
+        DOMAIN, "remove_items", {"names": ["korv", "mjolk 0"]}, blocking=True
+    )
+    await hass.async_block_till_done()
+
+    assert [item.name for item in data.items] == ["Korvbröd 0"]
+    assert [row["ProductName"] for row in fake_ica.rows(list_id)] == ["Korvbröd 0"]
+
+
+async def test_complete_items_matches_similar(hass, fake_ica, setup_integration):
+    """complete_items completes misspelt names but not other products."""
+    rows = make_rows(1, "Kaffefilter") + make_rows(1, "Mjölk")
+    fake_ica.add_list(LIST_NAME, rows)
+    data = await setup_integration()
+
+    results = await data.async_complete_items(["kaffe 0", "mjölkk 0"])
+
+    assert [result["success"] for result in results] == [False, True]
+    assert [item.complete for item in data.items] == [False, True]
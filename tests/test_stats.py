@@ -0,0 +1,103 @@
+"""Tests of the instrumentation of the ICA integration."""
+from custom_components.ica_shopping_list import WS_TYPE_STATS
+from custom_components.ica_shopping_list.stats import Instrumentation, timed
+
+from .conftest import LIST_NAME
+
+
+class Timed:
+    """Object with a timed method."""
+
+    def __init__(self, stats):
+        """Initialize the object."""
+        self.stats = stats
+
+    @timed("work")
+    async def async_work(self):
+        """Do nothing."""
+        return 1
+
+
+async def test_disabled_records_nothing():
+    """Nothing is recorded while instrumentation is off."""
+    stats = Instrumentation()
+
+    assert stats.start() is None
+    stats.stop("get", None)
+    stats.observe("rows", 10)
+    stats.increment("requests")
+    assert await Timed(stats).async_work() == 1
+
+    assert stats.as_dict() == {"enabled": False, "counters": {}, "histograms": {}}
+
+
+async def test_enabled_records_histograms_and_counters():
+    """Values, counters and timed calls are recorded while instrumentation is on."""
+    stats = Instrumentation(True)
+
+    stats.observe("rows", 5, (1, 10))
+    stats.observe("rows", 50, (1, 10))
+    stats.increment("requests")
+    stats.increment("requests", 2)
+    assert await Timed(stats).async_work() == 1
+
+    result = stats.as_dict()
+    assert result["counters"] == {"requests": 3}
+    assert result["histograms"]["rows"] == {
+        "count": 2,
+        "sum": 55,
+        "max": 50,
+        "mean": 27.5,
+        "buckets": {"1": 0, "10": 1, "inf": 1},
+    }
+    assert result["histograms"]["work"]["count"] == 1
+
+
+async def _stats(hass, hass_ws_client):
+    """Return the result of the stats websocket command."""
+    client = await hass_ws_client(hass)
+    await client.send_json_auto_id({"type": WS_TYPE_STATS})
+    resp = await client.receive_json()
+    assert resp["success"], resp
+    return resp["result"]
+
+
+async def test_stats_websocket(hass, hass_ws_client, fake_ica, setup_integration):
+    """The stats command returns the lists, breaker, counters and histograms."""
+    fake_ica.add_list(LIST_NAME)
+    data = await setup_integration(instrumentation=True, sync_delay=0.5)
+
+    await data.async_add("mjölk")
+    await hass.async_block_till_done()
+    result = await _stats(hass, hass_ws_client)
+
+    assert result["enabled"] is True
+    assert result["lists"] == {LIST_NAME: {"items": 1, "poller": data.poller.stats}}
+    assert result["breaker"]["state"] == "closed"
+    assert result["counters"]["requests"] >= 3
+    assert result["counters"]["logins"] == 1
+    histograms = result["histograms"]
+    assert histograms["add"]["count"] == 1
+    assert histograms["sync"]["count"] == 1
+    # The sync request is timed, not the debounce before it
+    assert histograms["sync"]["max"] < 0.5
+    assert histograms["payload_bytes"]["count"] == 1
+
+    assert hass.states.get("sensor.ica_requests") is not None
+    assert hass.states.get("sensor.ica_connection").state == "closed"
+
+
+async def test_stats_websocket_disabled(hass, hass_ws_client, fake_ica, setup_integration):
+    """Without instrumentation the stats command returns no counters or histograms."""
+    fake_ica.add_list(LIST_NAME)
+    data = await setup_integration()
+
+    await data.async_add("mjölk")
+    await hass.async_block_till_done()
+    result = await _stats(hass, hass_ws_client)
+
+    assert result["enabled"] is False
+    assert result["counters"] == {}
+    assert result["histograms"] == {}
+    assert result["lists"][LIST_NAME]["items"] == 1
+    assert hass.states.get("sensor.ica_requests") is None
@@ -0,0 +1,84 @@
+"""Tests of the item store and its store-sorted views."""
+from custom_components.ica_shopping_list.store import ItemStore, ShoppingItem
+
+from .conftest import LIST_NAME
+from .fake_ica import make_rows
+
+
+def _item(item_id, group, complete=False):
+    """Return an item of an article group, named by its id."""
+    return ShoppingItem(item_id, item_id, complete, -1, group)
+
+
+def _sorted_ids(store):
+    """Return the ids of the items in aisle order."""
+    return [item["id"] for item in store.as_dicts(True)]
+
+
+def test_sorted_by_aisle_order_then_group():
+    """Groups in aisle_order come first in that order, then the others by number."""
+    store = ItemStore(
+        [
+            _item("a", 5),
+            _item("b", 2),
+            _item("c", 9),
+            _item("d", 7),
+            _item("e", None),
+            _item("f", 2),
+        ],
+        aisle_order=[9, 2],
+    )
+
+    assert _sorted_ids(store) == ["c", "b", "f", "e", "a", "d"]
+    assert [item["id"] for item in store.as_dicts()] == ["a", "b", "c", "d", "e", "f"]
+
+
+def test_completed_items_sort_last():
+    """Completed items come after every item still to buy."""
+    store = ItemStore(
+        [_item("a", 1, complete=True), _item("b", 3), _item("c", 2, complete=True), _item("d", 4)],
+        aisle_order=[4],
+    )
+
+    assert _sorted_ids(store) == ["d", "b", "a", "c"]
+
+
+def test_changed_item_is_sorted_again():
+    """An item moves when it is completed and back to its place when it is not."""
+    store = ItemStore([_item("a", 1), _item("b", 1), _item("c", 2)])
+    assert _sorted_ids(store) == ["a", "b", "c"]
+
+    store.add(_item("a", 1, complete=True))
+    assert _sorted_ids(store) == ["b", "c", "a"]
+
+    store.add(_item("a", 1))
+    assert _sorted_ids(store) == ["a", "b", "c"]
+
+    store.remove("b")
+    store.add(_item("d", 1))
+    assert _sorted_ids(store) == ["a", "d", "c"]
+
+
+async def test_store_sorted_view(hass, hass_client, fake_ica, setup_integration):
+    """?sort=store returns the items in aisle order under an ETag of its own."""
+    rows = make_rows(3)
+    for row, group in zip(rows, (3, 1, 2)):
+        row["ArticleGroupId"] = group
+    fake_ica.add_list(LIST_NAME, rows)
+    await setup_integration()
+    client = await hass_client()
+
+    resp = await client.get("/api/shopping_list")
+    plain_etag = resp.headers["ETag"]
+    resp = await client.get("/api/shopping_list", params={"sort": "store"})
+    assert resp.status == 200
+    assert [item["name"] for item in await resp.json()] == ["Item 1", "Item 2", "Item 0"]
+    sorted_etag = resp.headers["ETag"]
+    assert sorted_etag != plain_etag
+
+    resp = await client.get(
+        "/api/shopping_list", params={"sort": "store"}, headers={"If-None-Match": sorted_etag}
+    )
+    assert resp.status == 304
+    resp = await client.get("/api/shopping_list", headers={"If-None-Match": sorted_etag})
+    assert resp.status == 200